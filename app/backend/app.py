@@ -1,31 +1,57 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, g
 from flask_cors import CORS
 from services.context_parser import MyContextParser as ContextParser
-from services.policy_retriever import PolicyRetriever
+from services.index_manager import IndexManager
 from services.precedent_retriever import PrecedentRetriever
 from services.citation_builder import CitationBuilder
+from services.precedent_writer import PrecedentWriter
+from services.precedent_backup import PrecedentBackupManager, BackupCorrupt
+from services.snippet_extractor import SnippetExtractor
+from services.metrics import metrics, begin_request_timings, end_request_timings, current_timings, inline_work_requested
+from services.log_setup import configure_logging
+from services.request_profiler import RequestProfiler
+from services.memory_monitor import MemoryMonitor
+from services.leg_executor import LegExecutor
+from services.batching_encoder import BatchingEncoder
+from services.single_flight import SingleFlight, flight_key
+from services.admission import AdmissionController, AdmittedEncoder
+from services.ingestion import IngestionQueue
+from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta  # Add this line
 import json
+import logging
 import traceback
 import sys
 import os
+import time
+import uuid
 
 
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
+# Caps policy PDF uploads (and any other request body)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 50)) * 1024 * 1024
+
+# Request-path logging goes through a background writer (see services/log_setup.py)
+configure_logging()
+log = logging.getLogger('app')
 
 # Initialize components
 print("🚀 Initializing Appian Knowledge Assistant...")
 print("="*60)
 
 try:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    documents_folder = os.path.join(base_dir, 'data', 'documents')
+    snapshots_folder = os.path.join(base_dir, 'data', 'index_snapshots')
+    
     # 1. Context Parser
     context_parser = ContextParser()
     print("✅ ContextParser initialized")
     
-    # 2. Policy Retriever (PDF Search)
-    policy_retriever = PolicyRetriever()
-    print("✅ PolicyRetriever initialized")
+    # 2. Policy Retriever (PDF Search) - owned by the index manager so snapshots can be hot-swapped
+    index_manager = IndexManager(snapshots_folder, documents_folder)
+    print("✅ IndexManager initialized")
     
     # 3. Precedent Retriever
     precedent_retriever = PrecedentRetriever()
@@ -35,10 +61,69 @@ try:
     citation_builder = CitationBuilder()
     print("✅ CitationBuilder initialized (simple version)")
     
-    # Load PDF documents from correct path
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    documents_folder = os.path.join(base_dir, 'data', 'documents')
+    # 5. Precedent Writer (single thread group-commits all saves)
+    precedent_writer = PrecedentWriter(os.path.join(base_dir, 'data', 'precedent_cases.json'))
+    print("✅ PrecedentWriter initialized")
+    
+    # 6. Precedent Backups (incremental, compressed snapshot chains)
+    backup_manager = PrecedentBackupManager(os.path.join(base_dir, 'data', 'backups'))
+    print("✅ PrecedentBackupManager initialized")
+    
+    # 7. Snippet Extractor (query-focused excerpts instead of whole pages)
+    snippet_extractor = SnippetExtractor()
+    print("✅ SnippetExtractor initialized")
+    
+    # 8. Request Profiler (admin-flagged requests only; needs PROFILE_TOKEN)
+    request_profiler = RequestProfiler(os.path.join(base_dir, 'data', 'profiles'))
+    print(f"✅ RequestProfiler initialized ({'enabled' if request_profiler.token else 'disabled - set PROFILE_TOKEN'})")
+    
+    # 9. Memory Monitor (breakdown + growth history for /api/memory)
+    memory_monitor = MemoryMonitor(index_manager, precedent_retriever)
+    print("✅ MemoryMonitor initialized")
+    
+    # 10. Leg Executor (policy and precedent searches of analyze-case run side by side)
+    leg_executor = LegExecutor(max_workers=int(os.environ.get('LEG_WORKERS', 8)))
+    leg_timeouts = {
+        'policies': float(os.environ.get('POLICY_LEG_TIMEOUT', 8.0)),
+        'precedents': float(os.environ.get('PRECEDENT_LEG_TIMEOUT', 4.0))
+    }
+    # Default policy-search budget for analyze-case (requests may pass budget_ms); unset = no budget
+    search_budget_ms = float(os.environ['SEARCH_BUDGET_MS']) if os.environ.get('SEARCH_BUDGET_MS') else None
+    print(f"✅ LegExecutor initialized ({leg_executor.max_workers} workers, timeouts {leg_timeouts})")
+    
+    # 11. Query Encoders: micro-batch query encodes from all request threads behind one admission
+    #     controller, so bursts queue briefly or degrade instead of piling up. One encoder per embedding
+    #     model: the precedent model's, shared with indexes built on the same model, plus one for any
+    #     other model a policy snapshot was built with
+    inference_admission = AdmissionController('inference',
+                                              max_concurrent=int(os.environ.get('INFERENCE_CONCURRENCY', 32)),
+                                              max_queue=int(os.environ.get('INFERENCE_QUEUE', 64)),
+                                              max_wait=float(os.environ.get('INFERENCE_MAX_WAIT', 2.0)))
+    # 'degrade' answers from keyword search / recent precedents when full; 'reject' answers 503
+    overload_policy = os.environ.get('OVERLOAD_POLICY', 'degrade')
+    def make_query_encoder(model):
+        return AdmittedEncoder(
+            BatchingEncoder(model,
+                            max_batch_size=int(os.environ.get('QUERY_BATCH_SIZE', 32)),
+                            max_wait_ms=float(os.environ.get('QUERY_BATCH_WAIT_MS', 5))),
+            inference_admission)
+    query_encoder = make_query_encoder(precedent_retriever.model)
+    precedent_retriever.query_encoder = query_encoder
+    index_manager.encoder_factory = make_query_encoder
+    index_manager.share_model(precedent_retriever.embedding_model, precedent_retriever.model, query_encoder)
+    print(f"✅ BatchingEncoder initialized (up to {query_encoder.max_batch_size} queries / {query_encoder.max_wait * 1000:g} ms, "
+          f"{inference_admission.max_concurrent} concurrent + {inference_admission.max_queue} queued, on overload: {overload_policy})")
+    
+    # 12. Single-flight groups (concurrent identical requests share one computation)
+    analysis_flights = SingleFlight('analyze_case')
+    search_flights = SingleFlight('test_search')
+    print("✅ SingleFlight initialized")
     
+    # 13. Ingestion Queue (uploaded PDFs are indexed in the background and hot-swapped in)
+    ingestion_queue = IngestionQueue(index_manager)
+    print("✅ IngestionQueue initialized")
+    
+    # Load PDF documents from correct path
     print(f"📚 PDF Folder: {documents_folder}")
     
     # Check if folder exists
@@ -60,15 +145,15 @@ try:
             print(f"ℹ️  Please add PDFs like: car_policy.pdf, EV_policy.pdf, etc.")
         else:
             print(f"📄 Found {len(pdf_files)} PDF files: {pdf_files}")
-        
-        # Load documents
-        print(f"🔧 Loading PDF documents...")
-        index_loaded = policy_retriever.load_documents(documents_folder)
-        if index_loaded:
-            print(f"✅ Loaded {policy_retriever.get_document_count()} PDFs")
-            print(f"✅ Created {policy_retriever.get_total_chunks()} searchable text chunks")
-        else:
-            print("⚠️ Failed to load documents - system will use mock data")
+    
+    # Load the newest index snapshot (falls back to indexing the PDFs in-process)
+    print(f"🔧 Loading PDF index...")
+    index_loaded = index_manager.load_initial()
+    if index_loaded:
+        print(f"✅ Loaded {index_manager.current().get_document_count()} PDFs (index {index_manager.version})")
+        print(f"✅ Created {index_manager.current().get_total_chunks()} searchable text chunks")
+    else:
+        print("⚠️ Failed to load documents - system will use mock data")
     
     print("="*60)
     
@@ -77,6 +162,90 @@ except Exception as e:
     traceback.print_exc()
     sys.exit(1)
 
+@app.before_request
+def start_request_timer():
+    """Start per-request latency tracking"""
+    g.request_started = time.perf_counter()
+    g.timings_token = begin_request_timings()
+
+@app.after_request
+def record_request_metrics(response):
+    """Record request latency and count by endpoint/status"""
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unknown'
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+        metrics.inc('http_requests_total', endpoint=endpoint, status=response.status_code)
+    memory_monitor.maybe_sample()
+    return response
+
+@app.teardown_request
+def end_request_timer(exc):
+    token = g.pop('timings_token', None)
+    if token is not None:
+        end_request_timings(token)
+
+def overloaded_response():
+    """503 for requests turned away while model inference is saturated (OVERLOAD_POLICY=reject)"""
+    response = jsonify({
+        'success': False,
+        'error': 'Server is busy, please retry shortly',
+        'overloaded': True
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def parse_budget_ms(value):
+    """A request's budget_ms as a float (None = no budget); ValueError unless a non-negative number"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError("budget_ms must be a number of milliseconds")
+    try:
+        budget_ms = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("budget_ms must be a number of milliseconds")
+    if not budget_ms >= 0 or budget_ms == float('inf'):
+        raise ValueError("budget_ms must be a non-negative number of milliseconds")
+    return budget_ms
+
+def search_policies(policy_retriever, queries, budget_ms=None, partitions=None):
+    """Policy leg of analyze-case: merged results of every query, plus the tier that served each.
+    
+    budget_ms covers all the queries together; partitions (from
+    policy_retriever.route()) limits them to the case's product line.
+    """
+    all_policies = []
+    tiers = []
+    started = time.perf_counter()
+    for i, query in enumerate(queries):
+        if query and isinstance(query, str) and query.strip():
+            try:
+                remaining = None
+                if budget_ms is not None:
+                    remaining = budget_ms - (time.perf_counter() - started) * 1000
+                with metrics.span('policy_search'):
+                    policies, tier = policy_retriever.search_with_budget(query, top_k=3, budget_ms=remaining,
+                                                                         partitions=partitions)
+                tiers.append(tier)
+                if policies:
+                    all_policies.extend(policies)
+                    log.debug("Query %d %r: %d results (%s)", i + 1, query, len(policies), tier)
+            except Exception as e:
+                log.warning("Search error for %r: %s", query, e)
+    return all_policies, tiers
+
+def find_precedents(context, answer_table=None):
+    """Precedent leg of analyze-case"""
+    with metrics.span('find_similar_cases'):
+        precedents = []
+        try:
+            precedents = precedent_retriever.find_similar_cases(context, top_k=3, answer_table=answer_table)
+            log.debug("Found %d similar precedent cases", len(precedents))
+        except Exception as e:
+            log.warning("Error finding precedents: %s", e)
+        return precedents
+
 def generate_suggested_actions(context, precedents, policies):
     """Generate suggested actions based on analysis"""
     actions = []
@@ -133,14 +302,11 @@ def generate_suggested_actions(context, precedents, policies):
 def save_precedent():
     """Save a case decision to precedent memory"""
     try:
-        print("\n" + "="*60)
-        print("💾 SAVE-PRECEDENT endpoint called")
-        
         if not request.is_json:
             return jsonify({'error': 'Request must be JSON'}), 400
         
         precedent_data = request.get_json()
-        print(f"📥 Received precedent data for case: {precedent_data.get('case_id', 'Unknown')}")
+        log.debug("Received precedent data for case %s", precedent_data.get('case_id', 'Unknown'))
         
         # Validate required fields
         required_fields = ['case_id', 'claim_type', 'status']
@@ -158,60 +324,28 @@ def save_precedent():
                 'error': 'Status must be "approved" or "rejected"'
             }), 400
         
-        # Define precedents file path
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        precedents_file = os.path.join(base_dir, 'data', 'precedent_cases.json')
-        
-        # Create data directory if it doesn't exist
-        data_dir = os.path.dirname(precedents_file)
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-            print(f"📁 Created data directory: {data_dir}")
-        
-        # Load existing precedents
-        precedents = []
-        if os.path.exists(precedents_file):
-            try:
-                with open(precedents_file, 'r') as f:
-                    precedents = json.load(f)
-                print(f"📚 Loaded {len(precedents)} existing precedents")
-            except Exception as e:
-                print(f"⚠️ Error loading precedents file: {e}")
-                precedents = []
-        else:
-            print(f"📝 Creating new precedents file: {precedents_file}")
-        
-        # Add timestamp and ID to new precedent
-        precedent_data['timestamp'] = datetime.now().isoformat()
-        precedent_data['id'] = len(precedents) + 1
-        
-        # Add to precedents array
-        precedents.append(precedent_data)
-        
-        # Save back to file
+        # Hand the record to the writer thread; returns once it is on disk
         try:
-            with open(precedents_file, 'w') as f:
-                json.dump(precedents, f, indent=2)
-            print(f"✅ Saved precedent #{len(precedents)} to {precedents_file}")
+            saved, total = precedent_writer.submit(precedent_data)
+            log.info("Saved precedent #%s (case %s)", saved['id'], saved.get('case_id'))
             
             return jsonify({
                 'success': True,
-                'message': f'Case {precedent_data["case_id"]} saved to precedent memory',
-                'precedent_id': precedent_data['id'],
-                'total_precedents': len(precedents),
-                'saved_file': precedents_file
+                'message': f'Case {saved["case_id"]} saved to precedent memory',
+                'precedent_id': saved['id'],
+                'total_precedents': total,
+                'saved_file': precedent_writer.precedents_file
             })
             
         except Exception as e:
-            print(f"❌ Error saving precedents file: {e}")
+            log.error("Error saving precedents file: %s", e)
             return jsonify({
                 'success': False,
                 'error': f'Failed to save precedents: {str(e)}'
             }), 500
             
     except Exception as e:
-        print(f"❌ ERROR in save_precedent: {str(e)}")
-        traceback.print_exc()
+        log.exception("Error in save_precedent")
         return jsonify({
             'success': False,
             'error': str(e),
@@ -225,15 +359,13 @@ def get_precedents():
         base_dir = os.path.dirname(os.path.abspath(__file__))
         precedents_file = os.path.join(base_dir, 'data', 'precedent_cases.json')
         
-        print(f"📖 Reading precedents from: {precedents_file}")
-        
         if os.path.exists(precedents_file):
             with open(precedents_file, 'r') as f:
                 precedents = json.load(f)
         else:
             precedents = []
         
-        print(f"📊 Found {len(precedents)} precedent cases")
+        log.debug("Read %d precedent cases from %s", len(precedents), precedents_file)
         
         return jsonify({
             'success': True,
@@ -242,35 +374,13 @@ def get_precedents():
         })
         
     except Exception as e:
-        print(f"❌ Error getting precedents: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'precedents': []
-        }), 500
-    """Get all precedent cases"""
-    try:
-        precedents_file = 'data/precedent_cases.json'
-        
-        if os.path.exists(precedents_file):
-            with open(precedents_file, 'r') as f:
-                precedents = json.load(f)
-        else:
-            precedents = []
-        
-        return jsonify({
-            'success': True,
-            'precedents': precedents,
-            'count': len(precedents)
-        })
-        
-    except Exception as e:
-        print(f"❌ Error getting precedents: {e}")
+        log.error("Error getting precedents: %s", e)
         return jsonify({
             'success': False,
             'error': str(e),
             'precedents': []
         }), 500
+
 @app.route('/api/get-precedents-enhanced', methods=['GET'])
 def get_precedents_enhanced():
     """Get all precedent cases with enhanced analytics"""
@@ -330,7 +440,7 @@ def get_precedents_enhanced():
         })
         
     except Exception as e:
-        print(f"❌ Error getting enhanced precedents: {e}")
+        log.error("Error getting enhanced precedents: %s", e)
         return jsonify({
             'success': False,
             'error': str(e),
@@ -402,7 +512,7 @@ def search_precedents():
         })
         
     except Exception as e:
-        print(f"❌ Error searching precedents: {e}")
+        log.error("Error searching precedents: %s", e)
         return jsonify({
             'success': False,
             'error': str(e),
@@ -413,37 +523,36 @@ def search_precedents():
 def clear_precedents():
     """Clear all precedent memory"""
     try:
-        print("\n" + "="*60)
-        print("🗑️  Clearing all precedent memory...")
+        log.info("Clearing all precedent memory")
         
-        # Clear the JSON file
-        precedents_file = 'data/precedent_cases.json'
+        precedents_file = precedent_writer.precedents_file
         
         if os.path.exists(precedents_file):
-            # Create a backup before clearing (optional)
-            backup_file = f"data/precedent_cases_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            # Snapshot before clearing - only records added since the last backup are written
+            backup = None
             try:
-                import shutil
-                shutil.copy2(precedents_file, backup_file)
-                print(f"📦 Created backup: {backup_file}")
+                with open(precedents_file, 'r') as f:
+                    precedents = json.load(f)
+                backup = backup_manager.snapshot(precedents)
+                log.info("Backup before clear", extra={'backup': backup})
             except Exception as backup_error:
-                print(f"⚠️ Could not create backup: {backup_error}")
+                log.warning("Could not create backup: %s", backup_error)
             
-            # Clear the file
-            with open(precedents_file, 'w') as f:
-                json.dump([], f)
+            # Clear the file (through the writer so in-flight saves don't race)
+            precedent_writer.clear()
             
-            print("✅ Precedent memory file cleared")
+            log.info("Precedent memory file cleared")
             
             return jsonify({
                 'success': True,
                 'message': 'All precedent memory has been cleared',
-                'backup_created': os.path.exists(backup_file) if 'backup_file' in locals() else False,
+                'backup_created': bool(backup and backup.get('created')),
+                'backup': backup,
                 'timestamp': datetime.now().isoformat()
             })
         else:
             # File doesn't exist, but that's okay
-            print("ℹ️  Precedent file doesn't exist (already empty)")
+            log.info("Precedent file doesn't exist (already empty)")
             return jsonify({
                 'success': True,
                 'message': 'Precedent memory was already empty',
@@ -451,8 +560,7 @@ def clear_precedents():
             })
             
     except Exception as e:
-        print(f"❌ ERROR clearing precedents: {str(e)}")
-        traceback.print_exc()
+        log.exception("Error clearing precedents")
         return jsonify({
             'success': False,
             'error': str(e),
@@ -461,9 +569,9 @@ def clear_precedents():
 
 @app.route('/api/backup-precedents', methods=['GET'])
 def backup_precedents():
-    """Create a backup of precedent memory"""
+    """Create an incremental snapshot of precedent memory"""
     try:
-        precedents_file = 'data/precedent_cases.json'
+        precedents_file = precedent_writer.precedents_file
         
         if not os.path.exists(precedents_file):
             return jsonify({
@@ -471,76 +579,107 @@ def backup_precedents():
                 'error': 'No precedent file found'
             }), 404
         
-        # Create backup filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = f"data/backups/precedent_backup_{timestamp}.json"
-        
-        # Ensure backup directory exists
-        os.makedirs(os.path.dirname(backup_file), exist_ok=True)
-        
-        # Copy file
-        import shutil
-        shutil.copy2(precedents_file, backup_file)
+        with open(precedents_file, 'r') as f:
+            precedents = json.load(f)
         
-        print(f"✅ Created backup: {backup_file}")
+        backup = backup_manager.snapshot(precedents)
+        message = (f"Backup created: {backup['file']}" if backup['created']
+                   else f"No backup needed: {backup['reason']}")
+        log.info(message)
         
         return jsonify({
             'success': True,
-            'message': f'Backup created: {backup_file}',
-            'backup_file': backup_file,
-            'timestamp': timestamp
+            'message': message,
+            'backup_file': backup.get('file'),
+            'backup': backup,
+            'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S')
         })
         
     except Exception as e:
-        print(f"❌ ERROR creating backup: {str(e)}")
+        log.error("Error creating backup: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/list-backups', methods=['GET'])
+def list_backups():
+    """List precedent backup chains"""
+    try:
+        chains = backup_manager.list_chains()
+        return jsonify({
+            'success': True,
+            'chains': chains,
+            'count': len(chains)
+        })
+    except Exception as e:
+        log.error("Error listing backups: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/analyze-case', methods=['POST'])
-def analyze_case():
-    """Main endpoint: Analyze case and return relevant PDF content"""
+@app.route('/api/restore-precedents', methods=['POST'])
+def restore_precedents():
+    """Restore precedent memory by replaying a backup chain (base + deltas)"""
     try:
-        print("\n" + "="*60)
-        print("📥 Received /api/analyze-case request")
-        
-        # Validate request
-        if not request.is_json:
-            return jsonify({'error': 'Request must be JSON'}), 400
+        data = request.get_json(silent=True) or {}
+        chain_id = data.get('chain_id')
+        upto_seq = data.get('upto_seq')
+        if upto_seq is not None and (isinstance(upto_seq, bool) or not isinstance(upto_seq, int) or upto_seq < 0):
+            return jsonify({'success': False, 'error': 'upto_seq must be a non-negative integer'}), 400
+        if chain_id is not None and not isinstance(chain_id, str):
+            return jsonify({'success': False, 'error': 'chain_id must be a string'}), 400
+        
+        log.info("Restoring precedents from chain %s", chain_id or 'latest')
+        precedents = backup_manager.restore(chain_id, upto_seq)
+        
+        # Snapshot the live list first so a mistaken restore can itself be restored away
+        # (after reading the chain: this snapshot becomes the newest one)
+        backup = None
+        try:
+            with open(precedent_writer.precedents_file, 'r') as f:
+                backup = backup_manager.snapshot(json.load(f))
+            log.info("Backup before restore", extra={'backup': backup})
+        except FileNotFoundError:
+            pass
+        except Exception as backup_error:
+            log.warning("Could not back up precedents before restore: %s", backup_error)
         
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'Empty request body'}), 400
+        total = precedent_writer.replace(precedents)
+        log.info("Restored %d precedents", total)
         
-        case_data = data.get('case_data', {})
-        print(f"📄 Case data received keys: {list(case_data.keys())}")
-        
-        # 1. Parse context from case
-        context = {}
-        try:
-            context = context_parser.extract_from_case_data(case_data)
-            print(f"🔍 Parsed context: {context}")
-        except Exception as e:
-            print(f"⚠️ Error parsing context: {e}")
-            # Use raw case data as fallback
-            context = {
-                'claim_type': case_data.get('Claim Type', ''),
-                'state': case_data.get('State', ''),
-                'claim_amount': case_data.get('Claim Amount', ''),
-                'damage_type': case_data.get('Damage Type', '')
-            }
+        return jsonify({
+            'success': True,
+            'message': f'Restored {total} precedents',
+            'total_precedents': total,
+            'backup': backup,
+            'timestamp': datetime.now().isoformat()
+        })
         
-        # 2. Build search queries
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except BackupCorrupt as e:
+        # The chain exists but can't be trusted; nothing was restored
+        log.error("Backup chain failed integrity checks: %s", e)
+        return jsonify({'success': False, 'error': str(e), 'corrupt': True}), 409
+    except Exception as e:
+        log.exception("Error restoring precedents")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'error_type': type(e).__name__
+        }), 500
+
+def run_analysis(context, policy_retriever, budget_ms=None):
+    """Steps 2-9 of analyze-case for a parsed context; returns the response body"""
+    # 2. Build search queries
+    with metrics.span('build_queries'):
         queries = []
         try:
             queries = context_parser.build_query_from_context(context)
-            print(f"🔎 Generated search queries: {queries}")
+            log.debug("Generated search queries: %s", queries)
         except Exception as e:
-            print(f"⚠️ Error building queries: {e}")
+            log.warning("Error building queries: %s", e)
             # Create simple queries from claim type
-            claim_type = context.get('claim_type') or case_data.get('Claim Type', '')
+            claim_type = context.get('claim_type')
             if claim_type:
                 queries = [
                     f"{claim_type} insurance policy",
@@ -549,38 +688,48 @@ def analyze_case():
                 ]
             else:
                 queries = ["insurance policy", "claim procedure"]
-        
+    
         if not queries:
             queries = ["insurance claim", "policy document"]
-        
-        # 3. Search in PDF documents
-        all_policies = []
-        for i, query in enumerate(queries[:3]):  # Use top 3 queries
-            if query and isinstance(query, str) and query.strip():
-                print(f"  {i+1}. Searching PDFs for: '{query}'")
-                try:
-                    policies = policy_retriever.search_in_documents(query, top_k=3)
-                    if policies:
-                        all_policies.extend(policies)
-                        print(f"    Found {len(policies)} results")
-                except Exception as e:
-                    print(f"    ⚠️ Search error: {e}")
-        
-        print(f"📊 Total policy excerpts found: {len(all_policies)}")
-        
-        # 4. Remove duplicates
+    
+    # 3. Search PDF documents and precedent cases concurrently; a leg over its budget is left out.
+    #    Dropdown-only cases were answered when the index was built and need no policy search.
+    #    The claim type routes the policy search to its product line's partitions (None = all of them).
+    partitions = policy_retriever.route(context.get('claim_type'))
+    metrics.inc('partition_routes_total', route='+'.join(partitions) if partitions else 'all')
+    answer_table = policy_retriever.answer_table
+    precomputed = None
+    if answer_table is not None:
+        precomputed = answer_table.lookup_policies(queries[:3], policy_retriever.chunks, partitions)
+        metrics.inc('answer_table_lookups_total', result='hit' if precomputed is not None else 'miss')
+    
+    leg_functions = {'precedents': lambda: find_precedents(context, answer_table)}
+    if precomputed is None:
+        leg_functions['policies'] = lambda: search_policies(policy_retriever, queries[:3], budget_ms, partitions)  # Use top 3 queries
+    legs = leg_executor.run(leg_functions, leg_timeouts)
+    
+    if precomputed is not None:
+        all_policies, search_tiers = precomputed, ['precomputed']
+    else:
+        all_policies, search_tiers = legs['policies'].value or ([], [])
+    precedents = legs['precedents'].value or []
+    incomplete_legs = {name: leg.summary() for name, leg in legs.items() if not leg.ok}
+    for name, info in incomplete_legs.items():
+        log.warning("analyze-case %s leg %s, answering without it", name, info['status'], extra=info)
+    
+    # 4. Remove duplicates
+    with metrics.span('dedupe'):
         unique_policies = []
         seen_hashes = set()
-        
+    
         for policy in all_policies:
             if policy and isinstance(policy, dict) and 'content' in policy:
-                # Create a simple hash of the content for deduplication
-                content = str(policy['content'])[:200]  # First 200 chars
-                content_hash = hash(content)
-                
+                # Indexed chunks are already content-addressed; mock results fall back to a text hash
+                content_hash = policy.get('chunk_hash') or hash(str(policy['content'])[:200])
+            
                 if content_hash not in seen_hashes:
                     seen_hashes.add(content_hash)
-                    
+                
                     # Add PDF URL for frontend
                     pdf_url = citation_builder.create_pdf_url(policy)
                     if pdf_url:
@@ -590,87 +739,163 @@ def analyze_case():
                         source = policy.get('source', '')
                         if source:
                             policy['pdf_url'] = f"/api/documents/{source}"
-                    
+                
                     # Format citation
                     policy['citation'] = citation_builder.format_citation(policy)
-                    
+                
                     # Ensure relevance score exists
                     if 'relevance_score' not in policy:
                         policy['relevance_score'] = 0.5
-                    
+                
                     unique_policies.append(policy)
-        
-        # 5. Highlight critical policies
+    
+    # 5. Highlight critical policies
+    with metrics.span('highlight_critical'):
         try:
             unique_policies = citation_builder.highlight_critical_policy(unique_policies, context)
             critical_count = sum(1 for p in unique_policies if p.get('critical', False))
-            print(f"🔍 Highlighted {critical_count} critical policies")
+            log.debug("Highlighted %d critical policies", critical_count)
         except Exception as e:
-            print(f"⚠️ Error in highlight_critical_policy: {e}")
+            log.warning("Error in highlight_critical_policy: %s", e)
             # Set all as non-critical if error occurs
             for policy in unique_policies:
                 policy['critical'] = False
-        
-        # 6. Sort by relevance and critical status
+    
+    # 6. Sort by relevance and critical status
+    with metrics.span('sort'):
         # First ensure all policies have relevance_score
         for policy in unique_policies:
             if 'relevance_score' not in policy:
                 policy['relevance_score'] = 0.5
-        
+    
         # Sort: critical first, then by relevance score
         unique_policies.sort(
             key=lambda x: (x.get('critical', False), x.get('relevance_score', 0)), 
             reverse=True
         )
-        
-        # 7. Get similar precedent cases
-        precedents = []
-        try:
-            precedents = precedent_retriever.find_similar_cases(context, top_k=3)
-            print(f"📂 Found {len(precedents)} similar precedent cases")
-        except Exception as e:
-            print(f"⚠️ Error finding precedents: {e}")
-        
-        # 8. Generate suggested actions
-        suggested_actions = generate_suggested_actions(context, precedents, unique_policies)
-        
-        # 9. Prepare response
-        response = {
-            'success': True,
-            'case_context': context,
-            'precedents': precedents,
-            'policies': unique_policies[:5],  # Top 5 most relevant
-            'suggested_actions': suggested_actions,
-            'search_info': {
-                'queries_used': queries[:3],
-                'documents_searched': policy_retriever.get_document_count(),
-                'results_found': len(unique_policies),
-                'critical_policies': sum(1 for p in unique_policies if p.get('critical', False))
-            }
+    
+    # 7. Replace whole-page content with a query-focused snippet
+    with metrics.span('snippets'):
+        top_policies = unique_policies[:5]  # Top 5 most relevant
+        snippet_query = " ".join(q for q in queries[:3] if isinstance(q, str))
+        for policy in top_policies:
+            if not policy.get('chunk_hash'):
+                continue  # Mock results are already short
+            excerpt = snippet_extractor.extract(str(policy.get('content', '')), snippet_query)
+            policy['content'] = excerpt['snippet']
+            policy['snippet'] = excerpt['snippet']
+            policy['snippet_start'] = excerpt['snippet_start']
+            policy['snippet_end'] = excerpt['snippet_end']
+            policy['highlights'] = excerpt['highlights']
+            policy['content_truncated'] = excerpt['truncated']
+            policy['full_text_url'] = f"/api/policy-text/{policy['chunk_hash']}"
+    
+    # 8. Generate suggested actions
+    suggested_actions = generate_suggested_actions(context, precedents, unique_policies)
+    
+    # 9. Prepare response
+    response = {
+        'success': True,
+        'case_context': context,
+        'precedents': precedents,
+        'policies': top_policies,
+        'suggested_actions': suggested_actions,
+        'search_info': {
+            'queries_used': queries[:3],
+            'documents_searched': policy_retriever.get_document_count(),
+            'results_found': len(unique_policies),
+            'critical_policies': sum(1 for p in unique_policies if p.get('critical', False)),
+            'search_tiers': search_tiers,
+            'partitions': list(partitions) if partitions else 'all'
         }
+    }
+    if incomplete_legs:
+        response['search_info']['partial'] = True
+        response['search_info']['incomplete_legs'] = incomplete_legs
+    
+    log.info("analyze-case: %d policy excerpts (%d unique), %d precedents, %d actions",
+             len(all_policies), len(unique_policies), len(precedents), len(suggested_actions),
+             extra={'claim_type': context.get('claim_type'), 'state': context.get('state')})
+    return response
+
+@app.route('/api/analyze-case', methods=['POST'])
+@request_profiler.profiled('analyze_case')
+def analyze_case():
+    """Main endpoint: Analyze case and return relevant PDF content"""
+    if overload_policy == 'reject' and inference_admission.saturated():
+        return overloaded_response()
+    try:
+        # Pin one index snapshot for the whole request (hot-swaps never change it mid-way)
+        policy_retriever = index_manager.current()
+        # Validate request
+        if not request.is_json:
+            return jsonify({'error': 'Request must be JSON'}), 400
+        
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'Empty request body'}), 400
         
-        print(f"📤 Sending response:")
-        print(f"   • {len(precedents)} precedent cases")
-        print(f"   • {len(unique_policies[:5])} policy excerpts")
-        print(f"   • {len(suggested_actions)} suggested actions")
-        print("="*60)
+        case_data = data.get('case_data', {})
+        log.debug("Case data keys: %s", list(case_data.keys()))
         
-        return jsonify(response)
+        # 1. Parse context from case
+        with metrics.span('parse_context'):
+            context = {}
+            try:
+                context = context_parser.extract_from_case_data(case_data)
+                log.debug("Parsed context: %s", context)
+            except Exception as e:
+                log.warning("Error parsing context: %s", e)
+                # Use raw case data as fallback
+                context = {
+                    'claim_type': case_data.get('Claim Type', ''),
+                    'state': case_data.get('State', ''),
+                    'claim_amount': case_data.get('Claim Amount', ''),
+                    'damage_type': case_data.get('Damage Type', '')
+                }
+        
+        # Optional latency budget for the policy searches: cheaper tiers answer when time is short
+        try:
+            budget_ms = parse_budget_ms(data.get('budget_ms', search_budget_ms))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # 2-9. Identical concurrent analyses (same context, same index) share one computation
+        def analyze():
+            # The leader's stage timings travel with the result: followers' own spans never ran
+            return run_analysis(context, policy_retriever, budget_ms), dict(current_timings() or {})
+        
+        key = flight_key(context, policy_retriever.snapshot_version, budget_ms)
+        if inline_work_requested():
+            # Profiled: do the work here, not in (or for) someone else's request
+            (response, leader_timings), shared = analyze(), False
+        else:
+            (response, leader_timings), shared = analysis_flights.do(key, analyze)
+        # Copy what this request adds to, the rest is shared read-only with the other callers.
+        # The key ignores whitespace differences, so echo this caller's own context, not the leader's.
+        response = dict(response, case_context=context, search_info=dict(response['search_info']))
+        if shared:
+            response['search_info']['coalesced'] = True
+            log.debug("analyze-case joined an identical in-flight analysis")
+        
+        # Optional per-request stage breakdown (serialization itself is only in /api/metrics)
+        if data.get('include_timings') or request.args.get('timings') == '1':
+            timings = dict(current_timings() or {})
+            if shared:
+                # Stages 2-9 ran in the leader's request (this one waited for them): report the leader's times
+                timings = dict(leader_timings, **timings)
+                response['search_info']['timings_from_leader'] = True
+            response['search_info']['timings_ms'] = timings
+        
+        with metrics.span('json_serialization'):
+            return jsonify(response)
     
     except Exception as e:
-        print(f"❌ ERROR in analyze_case: {str(e)}")
-        print(f"❌ ERROR TYPE: {type(e).__name__}")
-        
-        # Get detailed error info
-        error_trace = traceback.format_exc()
-        print(f"❌ FULL TRACEBACK:")
-        for line in error_trace.split('\n')[:10]:  # First 10 lines only
-            print(f"   {line}")
+        log.exception("Error in analyze_case (%s)", type(e).__name__)
         
         # Check if it's the NumPy error
         if "ambiguous" in str(e) or "any()" in str(e) or "all()" in str(e):
-            print("❌ DETECTED: NumPy array boolean error")
-            print("❌ This happens in citation_builder.py - using simplified version")
+            log.error("Detected NumPy array boolean error - check truthiness tests on arrays")
         
         # Return error but with some mock data for frontend
         return jsonify({
@@ -700,27 +925,23 @@ def serve_pdf(filename):
         documents_folder = os.path.join(base_dir, 'data', 'documents')
         documents_folder = os.path.normpath(documents_folder)
         
-        print(f"📄 PDF Request: {safe_filename}")
-        print(f"📄 Looking in: {documents_folder}")
-        
         # Check if file exists
         full_path = os.path.join(documents_folder, safe_filename)
         
         if os.path.exists(full_path) and safe_filename.lower().endswith('.pdf'):
-            print(f"✅ Serving: {safe_filename}")
+            log.debug("Serving %s", safe_filename)
             return send_from_directory(documents_folder, safe_filename, as_attachment=False)
         else:
-            print(f"❌ PDF not found: {full_path}")
-            print(f"❌ File exists: {os.path.exists(full_path)}")
+            log.warning("PDF not found: %s", full_path)
             
             # List available PDFs for debugging
             available = []
             if os.path.exists(documents_folder):
                 try:
                     available = [f for f in os.listdir(documents_folder) if f.lower().endswith('.pdf')]
-                    print(f"📄 Available PDFs: {available}")
+                    log.debug("Available PDFs: %s", available)
                 except Exception as e:
-                    print(f"❌ Error listing PDFs: {e}")
+                    log.error("Error listing PDFs: %s", e)
             
             return jsonify({
                 'error': f'PDF not found: {safe_filename}',
@@ -730,13 +951,47 @@ def serve_pdf(filename):
             }), 404
             
     except Exception as e:
-        print(f"❌ Error serving PDF: {e}")
+        log.error("Error serving PDF: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/policy-text/<chunk_hash>', methods=['GET'])
+def get_policy_text(chunk_hash):
+    """Full page text for a policy hit (analyze-case only returns a snippet).
+    
+    The page is re-read from the PDF; if that is not possible the response
+    holds just the indexed passage, with scope 'passage'.
+    """
+    try:
+        policy_retriever = index_manager.current()
+        chunk = policy_retriever.get_page_text(chunk_hash)
+        if chunk is None:
+            return jsonify({
+                'success': False,
+                'error': f'Policy text not found: {chunk_hash}'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'chunk_hash': chunk['chunk_hash'],
+            'content': chunk['page_text'] or chunk['content'],
+            'scope': 'page' if chunk['page_text'] else 'passage',
+            'passage': chunk['content'],
+            'char_start': chunk['char_start'],
+            'char_end': chunk['char_end'],
+            'source': chunk['source'],
+            'page': chunk['page'],
+            'locations': chunk['locations'],
+            'citation': citation_builder.format_citation(chunk)
+        })
+    except Exception as e:
+        log.error("Error fetching policy text: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
+        policy_retriever = index_manager.current()
         pdf_count = policy_retriever.get_document_count()
         precedent_count = len(precedent_retriever.precedents) if hasattr(precedent_retriever, 'precedents') else 0
         
@@ -765,6 +1020,7 @@ def health_check():
 def debug_info():
     """Debug information endpoint"""
     try:
+        policy_retriever = index_manager.current()
         pdf_list = policy_retriever.get_document_list()
         pdf_count = policy_retriever.get_document_count()
         chunks_count = policy_retriever.get_total_chunks()
@@ -780,6 +1036,9 @@ def debug_info():
             'pdf_count': pdf_count,
             'chunks_count': chunks_count,
             'precedent_count': precedent_count,
+            'index': index_manager.status(),
+            'query_encoder': query_encoder.stats(),
+            'admission': inference_admission.stats(),
             'backend_status': 'running',
             'python_version': sys.version.split()[0],
             'working_directory': os.getcwd(),
@@ -790,36 +1049,166 @@ def debug_info():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/test-search', methods=['POST'])
+@request_profiler.profiled('test_search')
 def test_search():
     """Test search endpoint (bypasses context parsing)"""
+    if overload_policy == 'reject' and inference_admission.saturated():
+        return overloaded_response()
     try:
+        policy_retriever = index_manager.current()
         data = request.get_json()
         query = data.get('query', 'car insurance')
+        partitions = policy_retriever.route(data.get('claim_type'))
         
-        print(f"\n🔍 TEST SEARCH REQUEST: '{query}'")
-        
-        # Perform search
-        results = policy_retriever.search_in_documents(query, top_k=3)
-        
-        # Add citations and PDF URLs
-        for result in results:
-            result['citation'] = citation_builder.format_citation(result)
-            result['pdf_url'] = citation_builder.create_pdf_url(result)
+        try:
+            budget_ms = parse_budget_ms(data.get('budget_ms'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        def run_search():
+            # Perform search
+            results, tier = policy_retriever.search_with_budget(query, top_k=3, budget_ms=budget_ms,
+                                                              partitions=partitions)
+            
+            # Internal criticality bits are not part of the API (analyze-case turns them into 'critical')
+            results = [{k: v for k, v in result.items() if k != 'flags'} for result in results]
+            
+            # Add citations and PDF URLs
+            for result in results:
+                result['citation'] = citation_builder.format_citation(result)
+                result['pdf_url'] = citation_builder.create_pdf_url(result)
+            
+            log.info("test-search %r: %d results (%s)", query, len(results), tier)
+            return results, tier
         
-        print(f"✅ Found {len(results)} results")
+        # Concurrent identical searches against the same index share one computation (unless profiled)
+        if inline_work_requested():
+            (results, tier), shared = run_search(), False
+        else:
+            (results, tier), shared = search_flights.do(
+                flight_key(query, policy_retriever.snapshot_version, budget_ms, partitions), run_search)
         
-        return jsonify({
+        response = {
             'success': True,
             'query': query,
             'results': results,
             'count': len(results),
+            'tier': tier,
+            'partitions': list(partitions) if partitions else 'all',
             'documents_searched': policy_retriever.get_document_count()
-        })
+        }
+        if shared:
+            response['coalesced'] = True
+        return jsonify(response)
         
     except Exception as e:
-        print(f"❌ Test search error: {e}")
+        log.error("Test search error: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/reload-index', methods=['POST'])
+def reload_index():
+    """Hot-swap the policy index to the newest (or a named) snapshot"""
+    try:
+        data = request.get_json(silent=True) or {}
+        previous = index_manager.version
+        version = index_manager.reload(data.get('snapshot'))
+        
+        return jsonify({
+            'success': True,
+            'previous_version': previous,
+            'version': version,
+            'chunks': index_manager.current().get_total_chunks(),
+            'documents': index_manager.current().get_document_count()
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except Exception as e:
+        log.exception("Error reloading index")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Latency histograms and counters in Prometheus text format"""
+    return app.response_class(
+        metrics.render_prometheus(),
+        mimetype='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+@app.route('/api/memory', methods=['GET'])
+def memory_report():
+    """Memory breakdown by component, plus growth since the oldest retained sample"""
+    try:
+        report = {
+            'success': True,
+            'current': memory_monitor.sample(),
+            'growth': memory_monitor.growth()
+        }
+        if request.args.get('history') == '1':
+            report['history'] = memory_monitor.history()
+        return jsonify(report)
+    except Exception as e:
+        log.error("Error building memory report: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/upload-policy', methods=['POST'])
+def upload_policy():
+    """Store an uploaded policy PDF and queue it for indexing"""
+    try:
+        upload = request.files.get('file')
+        if upload is None or not upload.filename:
+            return jsonify({'success': False, 'error': "No file uploaded (multipart field 'file')"}), 400
+        
+        filename = secure_filename(upload.filename)
+        if not filename.lower().endswith('.pdf'):
+            return jsonify({'success': False, 'error': 'Only PDF files can be uploaded'}), 400
+        if upload.stream.read(5) != b'%PDF-':
+            return jsonify({'success': False, 'error': f'{filename} is not a PDF'}), 400
+        upload.stream.seek(0)
+        
+        pdf_path = os.path.join(documents_folder, filename)
+        if os.path.exists(pdf_path):
+            return jsonify({'success': False, 'error': f'{filename} already exists'}), 409
+        
+        # Write next to the target, then hard-link it into place: the folder never holds a partial
+        # PDF, and link() fails if a concurrent upload of the same name got there first
+        os.makedirs(documents_folder, exist_ok=True)
+        tmp_path = f"{pdf_path}.upload.{uuid.uuid4().hex}"
+        try:
+            upload.save(tmp_path)
+            os.link(tmp_path, pdf_path)
+        except FileExistsError:
+            return jsonify({'success': False, 'error': f'{filename} already exists'}), 409
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        job = ingestion_queue.submit(filename, pdf_path)
+        log.info("Queued %s for ingestion", filename, extra={'job_id': job.job_id})
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(),
+            'status_url': f"/api/ingestion-jobs/{job.job_id}"
+        }), 202
+    except Exception as e:
+        log.exception("Error uploading policy")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/ingestion-jobs', methods=['GET'])
+def list_ingestion_jobs():
+    """Recent ingestion jobs, newest first"""
+    return jsonify({
+        'pending': ingestion_queue.pending(),
+        'jobs': [job.to_dict() for job in ingestion_queue.jobs()]
+    })
+
+@app.route('/api/ingestion-jobs/<job_id>', methods=['GET'])
+def ingestion_job_status(job_id):
+    """Progress of one ingestion job"""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': f'Unknown job {job_id}'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
 @app.route('/api/list-pdfs', methods=['GET'])
 def list_pdfs():
     """List all available PDF documents"""
@@ -860,7 +1249,7 @@ if __name__ == '__main__':
     print("  • Historical precedent lookup")
     print("="*60)
     print(f"Port: 5000")
-    print(f"PDF Documents: {policy_retriever.get_document_count()}")
+    print(f"PDF Documents: {index_manager.current().get_document_count()}")
     print("\nEndpoints:")
     print("  POST /api/analyze-case   - Main analysis endpoint")
     print("  POST /api/test-search    - Direct search test")
@@ -868,6 +1257,11 @@ if __name__ == '__main__':
     print("  GET  /api/list-pdfs      - List available PDFs")
     print("  GET  /api/health         - Health check")
     print("  GET  /api/debug          - Debug information")
+    print("  GET  /api/metrics        - Prometheus metrics")
+    print("  GET  /api/memory         - Memory breakdown and growth")
+    print("  POST /api/reload-index   - Hot-swap to the newest index snapshot")
+    print("  POST /api/upload-policy  - Upload a policy PDF (indexed in the background)")
+    print("  GET  /api/ingestion-jobs/[id] - Upload indexing progress")
     print("\nFrontend Instructions:")
     print("  1. Open index.html in browser")
     print("  2. Select claim type (Car, EV, Flood, etc.)")
@@ -877,6 +1271,7 @@ if __name__ == '__main__':
     print("  6. Click PDF links to open original documents")
     print("="*60)
     print("🚀 Server starting on http://localhost:5000")
+    print("ℹ️  Development server - for production run: python serve.py --workers N")
     print("="*60 + "\n")
     
     app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""Load generator for the Flask API.
+
+Replays a weighted mix of analyze-case, get-precedents, search-precedents,
+save-precedent and document fetches from N concurrent clients, either
+in-process through the Flask test client or against a running server, and
+reports throughput, error rate and latency percentiles per endpoint.
+--sweep repeats the run at increasing concurrency and reports where
+throughput stops scaling.
+
+Usage (from app/backend):
+    python -m benchmarks.load_test --concurrency 8 --duration 30
+    python -m benchmarks.load_test --sweep 1,2,4,8,16,32 --duration 15 --out load.json
+    python -m benchmarks.load_test --url http://localhost:5000 --concurrency 16
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from benchmarks import synthetic
+from benchmarks.run_benchmarks import summarize, git_commit
+
+DEFAULT_MIX = {
+    'analyze_case': 50,
+    'get_precedents': 15,
+    'search_precedents': 15,
+    'save_precedent': 5,
+    'document': 15
+}
+
+
+class InProcessTransport:
+    """Requests through the Flask test client (one client per thread)"""
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.close()
+        return response.status_code
+
+
+class HttpTransport:
+    """Requests against a running server"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+class Workload:
+    """Builds (method, path, body) for each endpoint in the mix"""
+
+    def __init__(self, pdf_names, mix):
+        self.pdf_names = pdf_names or ['missing.pdf']
+        names = [name for name, weight in mix.items() if weight > 0]
+        self.names = names
+        self.weights = [mix[name] for name in names]
+
+    def pick(self, rng):
+        name = rng.choices(self.names, weights=self.weights)[0]
+        return (name,) + getattr(self, f"_{name}")(rng)
+
+    def _analyze_case(self, rng):
+        return 'POST', '/api/analyze-case', {'case_data': synthetic.sample_case(rng)}
+
+    def _get_precedents(self, rng):
+        return 'GET', '/api/get-precedents', None
+
+    def _search_precedents(self, rng):
+        case = synthetic.sample_case(rng)
+        return 'POST', '/api/search-precedents', {
+            'claim_type': case['Claim Type'] if rng.random() < 0.5 else None,
+            'status': rng.choice([None, 'approved', 'rejected']),
+            'search': rng.choice(['', 'timely', case['State'].lower()])
+        }
+
+    def _save_precedent(self, rng):
+        record = synthetic.generate_precedents(1, seed=rng.randrange(10 ** 9))[0]
+        record.pop('id')
+        record.pop('timestamp')
+        return 'POST', '/api/save-precedent', record
+
+    def _document(self, rng):
+        return 'GET', f"/api/documents/{rng.choice(self.pdf_names)}", None
+
+
+def run_load(transport, workload, concurrency, duration, seed=42):
+    """Drive `concurrency` closed-loop clients for `duration` seconds"""
+    samples = {}            # endpoint -> [latency ms]
+    errors = {}             # endpoint -> count
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(client_id):
+        rng = random.Random(seed * 1000 + client_id)
+        while time.perf_counter() < deadline:
+            name, method, path, body = workload.pick(rng)
+            started = time.perf_counter()
+            try:
+                failed = transport.request(method, path, body) >= 400
+            except Exception:
+                failed = True
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                samples.setdefault(name, []).append(elapsed)
+                if failed:
+                    errors[name] = errors.get(name, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    endpoints = {}
+    for name, latencies in sorted(samples.items()):
+        stats = summarize(latencies)
+        stats['errors'] = errors.get(name, 0)
+        stats['error_rate'] = round(stats['errors'] / len(latencies), 4)
+        stats['throughput_rps'] = round(len(latencies) / wall, 2)
+        endpoints[name] = stats
+
+    all_latencies = [ms for latencies in samples.values() for ms in latencies]
+    overall = summarize(all_latencies) if all_latencies else {'runs': 0}
+    total_errors = sum(errors.values())
+    overall['errors'] = total_errors
+    overall['error_rate'] = round(total_errors / len(all_latencies), 4) if all_latencies else 0.0
+    overall['throughput_rps'] = round(len(all_latencies) / wall, 2)
+    return {'concurrency': concurrency, 'duration_s': round(wall, 2), 'overall': overall, 'endpoints': endpoints}
+
+
+def find_saturation(runs, min_gain=0.05):
+    """Last concurrency level whose throughput beat the previous one by at least `min_gain`"""
+    best = runs[0]
+    for previous, run in zip(runs, runs[1:]):
+        if run['overall']['throughput_rps'] < previous['overall']['throughput_rps'] * (1 + min_gain):
+            break
+        best = run
+    return best['concurrency']
+
+
+def print_run(run):
+    overall = run['overall']
+    print(f"\n▶ concurrency {run['concurrency']}: {overall['throughput_rps']} req/s, "
+          f"errors {overall['error_rate'] * 100:.1f}%")
+    print(f"  {'endpoint':<20}{'reqs':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err %':>8}")
+    for name, stats in list(run['endpoints'].items()) + [('ALL', overall)]:
+        if not stats.get('runs'):
+            continue
+        print(f"  {name:<20}{stats['runs']:>7}{stats['throughput_rps']:>9.1f}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['error_rate'] * 100:>8.1f}")
+
+
+def parse_mix(spec):
+    """'analyze_case=60,document=40' -> weights (unlisted endpoints get 0)"""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {name: 0 for name in DEFAULT_MIX}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in mix:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a weighted request mix against the API")
+    parser.add_argument('--url', help="Base URL of a running server (default: in-process test client)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent clients")
+    parser.add_argument('--sweep', help="Comma-separated concurrency levels, e.g. 1,2,4,8,16")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds per run")
+    parser.add_argument('--mix', help="Endpoint weights, e.g. analyze_case=60,document=40")
+    parser.add_argument('--allow-writes', action='store_true',
+                        help="Include save-precedent against a real server (writes to its precedent file)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help="Write JSON results here")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    scratch_dir = None
+    if args.url:
+        transport = HttpTransport(args.url)
+        if not args.allow_writes:
+            mix['save_precedent'] = 0
+        try:
+            with urllib.request.urlopen(args.url.rstrip('/') + '/api/list-pdfs', timeout=10) as response:
+                pdf_names = [p['filename'] for p in json.load(response).get('pdfs', [])]
+        except Exception:
+            pdf_names = []
+    else:
+        import app as app_module
+        from services.precedent_writer import PrecedentWriter
+        # Keep load-test saves out of the real precedent file; the writer creates it on the first save
+        scratch_dir = tempfile.mkdtemp(prefix='load_precedents_')
+        app_module.precedent_writer = PrecedentWriter(os.path.join(scratch_dir, 'precedents.json'))
+        transport = InProcessTransport(app_module.app)
+        pdf_names = app_module.index_manager.current().get_document_list()
+
+    try:
+        workload = Workload(pdf_names, mix)
+        levels = [int(level) for level in args.sweep.split(',')] if args.sweep else [args.concurrency]
+        runs = []
+        for level in levels:
+            run = run_load(transport, workload, level, args.duration, args.seed)
+            print_run(run)
+            runs.append(run)
+
+        report = {
+            'meta': {
+                'created': datetime.now().isoformat(),
+                'git_commit': git_commit(),
+                'target': args.url or 'in-process',
+                'mix': mix,
+                'duration_s': args.duration
+            },
+            'runs': runs
+        }
+        if len(runs) > 1:
+            report['saturation_concurrency'] = find_saturation(runs)
+            print(f"\n📈 Throughput stops scaling beyond concurrency {report['saturation_concurrency']}")
+
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"✅ Results written to {args.out}")
+    finally:
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
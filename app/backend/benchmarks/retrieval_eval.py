@@ -0,0 +1,285 @@
+"""Retrieval quality vs. latency across search configurations.
+
+Runs a golden set through PolicyRetriever under every configuration that
+is available here and through PrecedentRetriever, and prints recall@k and
+MRR next to mean/p95/p99 query latency in one table.
+
+Configurations:
+    exact        brute-force inner product over the float32 embeddings
+    hnsw-efN     FAISS HNSW (M=--hnsw-m) at each --ef search depth
+    sq8          8-bit scalar-quantized vectors (FAISS, else simulated in NumPy)
+    hybrid       reciprocal-rank fusion of exact semantic and keyword results
+    keyword      keyword search only (the no-model fallback)
+
+Golden set JSON:
+    {
+      "policies": [
+        {"query": "flood water damage", "expected": [{"source": "flood_policy.pdf", "page": 3}]},
+        {"case_context": {"claim_type": "EV Insurance", "state": "Texas"},
+         "expected": [{"source": "EV_policy.pdf"}]}
+      ],
+      "precedents": [
+        {"case_context": {"claim_type": "Flood", "state": "Florida"}, "expected_case_ids": ["FL-09321"]}
+      ]
+    }
+Entries with a case_context are searched like analyze-case does (the
+ContextParser queries, merged). An expected hit without a page matches any
+page of that source.
+
+Usage (from app/backend):
+    python -m benchmarks.retrieval_eval --synthetic --docs 20
+    python -m benchmarks.retrieval_eval --golden golden.json --documents data/documents
+    python -m benchmarks.retrieval_eval --golden golden.json --snapshot data/index_snapshots/<version>
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import synthetic
+from benchmarks.run_benchmarks import summarize
+from services.context_parser import MyContextParser
+from services.policy_retriever import PolicyRetriever, faiss
+
+
+def synthetic_golden(manifest, precedents, n_precedent_queries=50, seed=42):
+    """Golden set derived from a generated corpus: each page's clause is the answer to its query"""
+    policies = [{
+        'query': f"{entry['claim_type']} {entry['subject']} coverage in {entry['state']}",
+        'expected': [{'source': entry['file'], 'page': entry['page']}]
+    } for entry in manifest]
+
+    rng = random.Random(seed)
+    queries = []
+    for precedent in rng.sample(precedents, min(n_precedent_queries, len(precedents))):
+        context = {k: precedent[k] for k in ('claim_type', 'state', 'damage_type')}
+        relevant = [p['case_id'] for p in precedents
+                    if all(p.get(k) == v for k, v in context.items())]
+        queries.append({'case_context': context, 'expected_case_ids': relevant})
+    return {'policies': policies, 'precedents': queries}
+
+
+def score_ranking(ranked_keys, is_relevant, expected_count, k):
+    """(recall@k, reciprocal rank) for one query"""
+    top = ranked_keys[:k]
+    found = sum(1 for key in top if is_relevant(key))
+    recall = found / min(k, expected_count) if expected_count else 0.0
+    rank = next((i + 1 for i, key in enumerate(ranked_keys) if is_relevant(key)), None)
+    return min(1.0, recall), (1.0 / rank if rank else 0.0)
+
+
+class PolicyEvaluator:
+    """Applies one configuration at a time to a loaded retriever and scores the golden queries"""
+
+    def __init__(self, retriever, k=5):
+        self.retriever = retriever
+        self.k = k
+        self.parser = MyContextParser()
+        self._exact_embeddings = retriever.embeddings
+
+    def configurations(self, ef_values, hnsw_m):
+        configs = []
+        if self.retriever.model is not None and self._exact_embeddings is not None:
+            configs.append(('exact', self._use_exact, self._semantic))
+            if faiss is not None:
+                for ef in ef_values:
+                    configs.append((f"hnsw-ef{ef}", lambda ef=ef: self._use_hnsw(hnsw_m, ef), self._semantic))
+            configs.append(('sq8' if faiss is not None else 'sq8-simulated', self._use_sq8, self._semantic))
+            configs.append(('hybrid', self._use_exact, self._hybrid))
+        configs.append(('keyword', self._use_exact, self._keyword))
+        return configs
+
+    # --- configurations ---
+
+    def _use_exact(self):
+        self.retriever.ann_index = None
+        self.retriever.embeddings = self._exact_embeddings
+
+    def _use_hnsw(self, hnsw_m, ef):
+        self._use_exact()
+        self.retriever.build_ann_index(hnsw_m=hnsw_m, ef_search=ef)
+
+    def _use_sq8(self):
+        self._use_exact()
+        vectors = np.ascontiguousarray(self._exact_embeddings, dtype=np.float32)
+        if faiss is not None:
+            index = faiss.IndexScalarQuantizer(vectors.shape[1], faiss.ScalarQuantizer.QT_8bit,
+                                               faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.add(vectors)
+            self.retriever.ann_index = index
+        else:
+            # Per-dimension int8 round trip: same accuracy loss, no speed-up
+            low, high = vectors.min(axis=0), vectors.max(axis=0)
+            scale = np.where(high > low, (high - low) / 255.0, 1.0)
+            codes = np.round((vectors - low) / scale).astype(np.uint8)
+            self.retriever.embeddings = codes.astype(np.float32) * scale + low
+
+    # --- search strategies ---
+
+    def _semantic(self, query, k):
+        return self.retriever._semantic_search(query, k)
+
+    def _keyword(self, query, k):
+        return self.retriever._keyword_search(query, k)
+
+    def _hybrid(self, query, k, rrf_k=60):
+        fused = {}
+        for results in (self.retriever._semantic_search(query, k * 4),
+                        self.retriever._keyword_search(query, k * 4)):
+            for rank, result in enumerate(results):
+                entry = fused.setdefault(result['chunk_hash'], [0.0, result])
+                entry[0] += 1.0 / (rrf_k + rank + 1)
+        ranked = sorted(fused.values(), key=lambda e: e[0], reverse=True)
+        return [result for _, result in ranked[:k]]
+
+    # --- evaluation ---
+
+    def queries_for(self, entry):
+        if entry.get('query'):
+            return [entry['query']]
+        context = dict(entry.get('case_context', {}))
+        if context.get('claim_amount') is not None:
+            context['claim_amount'] = str(context['claim_amount'])
+        return [q for q in self.parser.build_query_from_context(context)[:3] if q]
+
+    def evaluate(self, search, golden):
+        recalls, reciprocal_ranks, latencies = [], [], []
+        for entry in golden:
+            expected = entry.get('expected', [])
+            started = time.perf_counter()
+            per_query = [search(query, self.k) for query in self.queries_for(entry)]
+            latencies.append((time.perf_counter() - started) * 1000)
+
+            # Keep each strategy's own order (hybrid is in RRF order, its scores are not comparable);
+            # several queries are merged by rank - all first hits, then all second hits, ...
+            hits = [results[rank] for rank in range(max(map(len, per_query), default=0))
+                    for results in per_query if rank < len(results)]
+            ranked, seen = [], set()
+            for hit in hits:
+                locations = tuple((loc['source'], loc['page'])
+                                  for loc in hit.get('locations') or [{'source': hit['source'], 'page': hit['page']}])
+                if locations not in seen:
+                    seen.add(locations)
+                    ranked.append(locations)
+
+            def is_relevant(locations):
+                return any(source == e['source'] and e.get('page') in (None, page)
+                           for source, page in locations for e in expected)
+            recall, rr = score_ranking(ranked, is_relevant, len(expected), self.k)
+            recalls.append(recall)
+            reciprocal_ranks.append(rr)
+        return recalls, reciprocal_ranks, latencies
+
+
+def evaluate_precedents(precedent_retriever, golden, k):
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for entry in golden:
+        expected = set(entry.get('expected_case_ids', []))
+        started = time.perf_counter()
+        results = precedent_retriever.find_similar_cases(entry.get('case_context', {}), top_k=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recall, rr = score_ranking([r.get('case_id') for r in results], expected.__contains__, len(expected), k)
+        recalls.append(recall)
+        reciprocal_ranks.append(rr)
+    return recalls, reciprocal_ranks, latencies
+
+
+def table_row(target, config, k, recalls, reciprocal_ranks, latencies):
+    latency = summarize(latencies) if latencies else {}
+    return {
+        'target': target,
+        'config': config,
+        'queries': len(recalls),
+        f'recall@{k}': round(sum(recalls) / len(recalls), 4) if recalls else None,
+        'mrr': round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4) if reciprocal_ranks else None,
+        'mean_ms': latency.get('mean_ms'),
+        'p95_ms': latency.get('p95_ms'),
+        'p99_ms': latency.get('p99_ms')
+    }
+
+
+def print_table(rows, k):
+    print(f"\n{'target':<11}{'config':<16}{'queries':>8}{'recall@' + str(k):>11}{'MRR':>8}"
+          f"{'mean ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in rows:
+        print(f"{row['target']:<11}{row['config']:<16}{row['queries']:>8}"
+              f"{row[f'recall@{k}'] if row[f'recall@{k}'] is not None else '-':>11}"
+              f"{row['mrr'] if row['mrr'] is not None else '-':>8}"
+              f"{row['mean_ms'] or 0:>10.2f}{row['p95_ms'] or 0:>10.2f}{row['p99_ms'] or 0:>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency per configuration")
+    parser.add_argument('--golden', help="Golden set JSON (see module docstring)")
+    parser.add_argument('--synthetic', action='store_true', help="Generate corpus and golden set")
+    parser.add_argument('--docs', type=int, default=10, help="Synthetic PDFs (with --synthetic)")
+    parser.add_argument('--pages', type=int, default=5, help="Pages per synthetic PDF")
+    parser.add_argument('--precedents-count', type=int, default=300, help="Synthetic precedents")
+    parser.add_argument('--documents', help="PDF folder to index (real corpus)")
+    parser.add_argument('--snapshot', help="Index snapshot folder to load instead of indexing PDFs")
+    parser.add_argument('--precedents-file', help="Precedent JSON for the precedent queries")
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--ef', default='16,64,256', help="HNSW efSearch values to try")
+    parser.add_argument('--hnsw-m', type=int, default=32)
+    parser.add_argument('--out', help="Write the table as JSON here")
+    args = parser.parse_args(argv)
+
+    if not args.synthetic and not args.golden:
+        parser.error("pass --golden FILE or --synthetic")
+
+    work_dir = tempfile.mkdtemp(prefix='retrieval_eval_') if args.synthetic else None
+    try:
+        if args.synthetic:
+            docs_dir = os.path.join(work_dir, 'documents')
+            manifest = synthetic.generate_policy_pdfs(docs_dir, args.docs, args.pages)
+            precedents_file = os.path.join(work_dir, 'precedent_cases.json')
+            precedents = synthetic.write_precedents(precedents_file, args.precedents_count)
+            golden = synthetic_golden(manifest, precedents)
+        else:
+            with open(args.golden) as f:
+                golden = json.load(f)
+            docs_dir = args.documents
+            precedents_file = args.precedents_file
+
+        retriever = PolicyRetriever()
+        if args.snapshot:
+            retriever.load_snapshot(args.snapshot)
+            # Memory-mapped snapshots are read-only; configurations swap in their own arrays
+            retriever.embeddings = np.asarray(retriever.embeddings, dtype=np.float32)
+        elif docs_dir:
+            retriever.load_documents(docs_dir)
+
+        rows = []
+        if golden.get('policies') and len(retriever.chunks):
+            evaluator = PolicyEvaluator(retriever, k=args.k)
+            ef_values = [int(ef) for ef in args.ef.split(',') if ef]
+            for name, apply, search in evaluator.configurations(ef_values, args.hnsw_m):
+                apply()
+                rows.append(table_row('policies', name, args.k, *evaluator.evaluate(search, golden['policies'])))
+
+        if golden.get('precedents') and precedents_file:
+            from services.precedent_retriever import PrecedentRetriever
+            precedent_retriever = PrecedentRetriever(precedents_file)
+            rows.append(table_row('precedents', 'exact', args.k,
+                                  *evaluate_precedents(precedent_retriever, golden['precedents'], args.k)))
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_table(rows, args.k)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'k': args.k, 'rows': rows}, f, indent=2)
+        print(f"✅ Results written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
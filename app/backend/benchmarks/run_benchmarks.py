@@ -0,0 +1,237 @@
+"""Benchmark suite for the retrieval and precedent paths.
+
+Builds a synthetic corpus (N policy PDFs, M precedents) in a temp folder,
+times each stage and writes one JSON document so runs from different
+commits can be diffed with --compare.
+
+Usage (from app/backend):
+    python -m benchmarks.run_benchmarks --docs 20 --precedents 500 --out bench.json
+    python -m benchmarks.run_benchmarks --compare baseline.json --out bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from benchmarks import synthetic
+
+
+def timed(fn, repeat=20, warmup=2):
+    """Run `fn` `warmup + repeat` times; latency stats over the timed runs in ms"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        'runs': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p95_ms': round(percentile(ordered, 95), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+        'min_ms': round(ordered[0], 3),
+        'max_ms': round(ordered[-1], 3)
+    }
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+class BenchmarkSuite:
+    """Synthetic corpus plus one method per benchmark; results collect in self.results"""
+
+    def __init__(self, work_dir, n_docs, pages_per_doc, n_precedents, repeat, seed):
+        self.work_dir = work_dir
+        self.docs_dir = os.path.join(work_dir, 'documents')
+        self.precedents_file = os.path.join(work_dir, 'precedent_cases.json')
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+        self.results = {}
+
+        self.manifest = synthetic.generate_policy_pdfs(self.docs_dir, n_docs, pages_per_doc, seed)
+        synthetic.write_precedents(self.precedents_file, n_precedents, seed)
+        self.queries = [f"{entry['claim_type']} {entry['subject']} {entry['state']}"
+                        for entry in self.manifest]
+        self.retriever = None
+        self.precedent_retriever = None
+
+    def record(self, name, stats, **info):
+        stats.update(info)
+        self.results[name] = stats
+        print(f"  {name:<28} p50 {stats['p50_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms")
+
+    def bench_load_documents(self):
+        from services.policy_retriever import PolicyRetriever
+        retriever = PolicyRetriever()
+
+        # Extraction alone, then the full load (extract + chunk + encode)
+        pdf_paths = [os.path.join(self.docs_dir, f) for f in sorted(os.listdir(self.docs_dir))
+                     if f.endswith('.pdf')]
+        self.record('extract_pdfs', timed(
+            lambda: [retriever._extract_text_from_pdf(p) for p in pdf_paths],
+            repeat=max(1, self.repeat // 5), warmup=0), documents=len(pdf_paths))
+
+        def load():
+            fresh = PolicyRetriever(model=retriever.model)
+            fresh.load_documents(self.docs_dir)
+            fresh.snapshot_version = 'benchmark'
+            self.retriever = fresh
+        self.record('load_documents', timed(load, repeat=max(1, self.repeat // 10), warmup=0),
+                    documents=len(pdf_paths))
+        self.results['load_documents']['chunks'] = len(self.retriever.chunks)
+
+    def bench_search(self):
+        queries = self.queries
+        cursor = iter(range(10 ** 9))
+
+        def next_query():
+            return queries[next(cursor) % len(queries)]
+
+        if self.retriever.model is not None and self.retriever.embeddings is not None:
+            self.record('semantic_search', timed(
+                lambda: self.retriever._semantic_search(next_query(), top_k=3), repeat=self.repeat))
+        self.record('keyword_search', timed(
+            lambda: self.retriever._keyword_search(next_query(), top_k=3), repeat=self.repeat))
+
+    def bench_precedents(self):
+        from services.precedent_retriever import PrecedentRetriever
+        self.precedent_retriever = PrecedentRetriever(self.precedents_file)
+        contexts = [{'claim_type': e['claim_type'], 'state': e['state']} for e in self.manifest]
+        self.record('find_similar_cases', timed(
+            lambda: self.precedent_retriever.find_similar_cases(self.rng.choice(contexts), top_k=3),
+            repeat=self.repeat), precedents=len(self.precedent_retriever.precedents))
+
+    def bench_save_precedent(self, threads=8):
+        from services.precedent_writer import PrecedentWriter
+        path = os.path.join(self.work_dir, 'writer_bench.json')
+        shutil.copy(self.precedents_file, path)
+        writer = PrecedentWriter(path)
+        records = synthetic.generate_precedents(self.repeat * threads, seed=7)
+
+        self.record('save_precedent', timed(
+            lambda: writer.submit(dict(records[self.rng.randrange(len(records))])),
+            repeat=self.repeat))
+
+        # Concurrent saves exercise group commit; report per-save latency across threads
+        samples, lock = [], threading.Lock()
+
+        def worker(chunk):
+            for record in chunk:
+                started = time.perf_counter()
+                writer.submit(dict(record))
+                with lock:
+                    samples.append((time.perf_counter() - started) * 1000)
+        workers = [threading.Thread(target=worker, args=(records[i::threads],)) for i in range(threads)]
+        started = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+        self.record('save_precedent_concurrent', summarize(samples), threads=threads,
+                    saves_per_sec=round(len(samples) / elapsed, 1))
+
+    def bench_analyze_case(self):
+        import app as app_module
+        app_module.index_manager.publish(self.retriever)
+        app_module.precedent_retriever = self.precedent_retriever
+        client = app_module.app.test_client()
+
+        def request():
+            response = client.post('/api/analyze-case', json={'case_data': synthetic.sample_case(self.rng)})
+            if response.status_code != 200:
+                raise RuntimeError(f"analyze-case returned {response.status_code}")
+        self.record('api_analyze_case', timed(request, repeat=self.repeat))
+
+
+def compare(baseline, current):
+    """Print p50 change per benchmark against a previous results file"""
+    print(f"\nComparison with {baseline['meta'].get('git_commit') or 'baseline'}:")
+    for name, stats in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before or not before.get('p50_ms'):
+            print(f"  {name:<28} (new)")
+            continue
+        change = (stats['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+        print(f"  {name:<28} p50 {before['p50_ms']:>10.3f} -> {stats['p50_ms']:>10.3f} ms ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark retrieval, precedents and analyze-case")
+    parser.add_argument('--docs', type=int, default=10, help="Synthetic policy PDFs")
+    parser.add_argument('--pages', type=int, default=5, help="Pages per PDF")
+    parser.add_argument('--precedents', type=int, default=200, help="Synthetic precedent records")
+    parser.add_argument('--repeat', type=int, default=30, help="Timed runs per benchmark")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-e2e', action='store_true', help="Skip the Flask analyze-case benchmark")
+    parser.add_argument('--out', default='benchmark_results.json', help="Write JSON results here")
+    parser.add_argument('--compare', help="Previous results JSON to compare against")
+    parser.add_argument('--keep', action='store_true', help="Keep the synthetic corpus folder")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='policy_bench_')
+    print(f"🔧 Generating {args.docs} PDFs x {args.pages} pages and {args.precedents} precedents in {work_dir}")
+    try:
+        suite = BenchmarkSuite(work_dir, args.docs, args.pages, args.precedents, args.repeat, args.seed)
+        suite.bench_load_documents()
+        suite.bench_search()
+        suite.bench_precedents()
+        suite.bench_save_precedent()
+        if not args.no_e2e:
+            suite.bench_analyze_case()
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(),
+            'git_commit': git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args)
+        },
+        'results': suite.results
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
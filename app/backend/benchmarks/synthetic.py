@@ -0,0 +1,199 @@
+"""Deterministic synthetic corpora for benchmarks and retrieval evaluation.
+
+Policy PDFs are written with a tiny stdlib-only PDF writer (Helvetica text
+pages) so PyPDF2 can extract them like the real documents. Every page also
+carries one uniquely numbered clause; the returned manifest records where
+each clause lives, which gives evaluation tools a known answer per query.
+"""
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+PRODUCTS = {
+    'Car Insurance': {
+        'prefix': 'car',
+        'subjects': ['collision damage', 'windshield repair', 'rental vehicle', 'towing', 'theft of vehicle'],
+        'damage_types': ['Collision', 'Theft', 'Vandalism']
+    },
+    'EV Insurance': {
+        'prefix': 'ev',
+        'subjects': ['battery replacement', 'charging station damage', 'drive unit failure',
+                     'thermal runaway', 'charging cable theft'],
+        'damage_types': ['Battery', 'Collision', 'Electrical']
+    },
+    'Flood Insurance': {
+        'prefix': 'flood',
+        'subjects': ['water damage', 'basement flooding', 'mold remediation', 'FEMA coordination',
+                     'storm surge'],
+        'damage_types': ['Water', 'Structural', 'Contents']
+    },
+    'Health Insurance': {
+        'prefix': 'health',
+        'subjects': ['hospital admission', 'prescription coverage', 'pre-authorization',
+                     'emergency treatment', 'specialist referral'],
+        'damage_types': ['Treatment', 'Medication', 'Surgery']
+    },
+    'Fire Insurance': {
+        'prefix': 'fire',
+        'subjects': ['smoke damage', 'structural fire loss', 'arson investigation',
+                     'temporary housing', 'contents replacement'],
+        'damage_types': ['Fire', 'Smoke', 'Structural']
+    },
+}
+STATES = ['California', 'Texas', 'Florida']
+
+FILLER = [
+    'The insured must cooperate fully with the adjuster assigned to the claim.',
+    'Coverage is subject to the deductible stated in the declarations page.',
+    'Claims must be reported within 24 hours of discovery of the loss.',
+    'Documentation including photos, receipts and police reports is required.',
+    'Amounts exceeding 30000 dollars require supervisor approval before payment.',
+    'Failure to comply with these conditions may result in denial of the claim.',
+    'The company may request an independent inspection of the damaged property.',
+    'Payments are issued within thirty days of receiving a complete claim file.',
+]
+
+
+def _clause(product, subject, article, state, limit):
+    return (f"Article {article}: {product} claims involving {subject} in {state} are covered up to "
+            f"{limit} dollars. Reference code {article.replace('.', '-')}-{subject.split()[0].upper()}.")
+
+
+def generate_policy_pdfs(out_dir, n_docs=10, pages_per_doc=5, seed=42):
+    """Write `n_docs` policy PDFs to `out_dir`; returns the clause manifest.
+
+    Manifest entries: {'file', 'page', 'claim_type', 'state', 'subject', 'article', 'text'}.
+    """
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    product_names = list(PRODUCTS)
+    manifest = []
+
+    for doc_idx in range(n_docs):
+        product = product_names[doc_idx % len(product_names)]
+        spec = PRODUCTS[product]
+        filename = f"{spec['prefix']}_policy_{doc_idx:03d}.pdf"
+        pages = []
+        for page_num in range(1, pages_per_doc + 1):
+            subject = rng.choice(spec['subjects'])
+            state = rng.choice(STATES)
+            article = f"{doc_idx + 1}.{page_num}"
+            clause = _clause(product, subject, article, state, rng.choice([5000, 20000, 30000, 50000, 100000]))
+            body = [clause] + rng.sample(FILLER, k=min(len(FILLER), rng.randint(4, 7)))
+            rng.shuffle(body)
+            pages.append(' '.join(body))
+            manifest.append({
+                'file': filename,
+                'page': page_num,
+                'claim_type': product,
+                'state': state,
+                'subject': subject,
+                'article': article,
+                'text': clause
+            })
+        write_text_pdf(os.path.join(out_dir, filename), pages)
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def generate_precedents(n, seed=42):
+    """`n` precedent records shaped like data/precedent_cases.json"""
+    rng = random.Random(seed)
+    factors = ['timely_filing', 'proper_documentation', 'within_coverage', 'late_filing',
+               'missing_documents', 'policy_exclusion', 'prior_claims', 'supervisor_review']
+    started = datetime(2024, 1, 1)
+    precedents = []
+    for i in range(n):
+        product = rng.choice(list(PRODUCTS))
+        spec = PRODUCTS[product]
+        status = rng.choice(['approved', 'rejected'])
+        subject = rng.choice(spec['subjects'])
+        precedents.append({
+            'id': i + 1,
+            'case_id': f"{spec['prefix'].upper()}-{10000 + i}",
+            'claim_type': product,
+            'state': rng.choice(STATES),
+            'claim_amount': rng.choice([8000, 15000, 25000, 42000, 65000, 120000]),
+            'status': status,
+            'damage_type': rng.choice(spec['damage_types']),
+            'decision_reason': f"{product} claim for {subject} {status}",
+            'key_factors': rng.sample(factors, k=3),
+            'timestamp': (started + timedelta(hours=i)).isoformat()
+        })
+    return precedents
+
+
+def write_precedents(path, n, seed=42):
+    precedents = generate_precedents(n, seed)
+    with open(path, 'w') as f:
+        json.dump(precedents, f, indent=2)
+    return precedents
+
+
+def sample_case(rng):
+    """Frontend-shaped case_data for /api/analyze-case"""
+    product = rng.choice(list(PRODUCTS))
+    return {
+        'Claim Type': product,
+        'State': rng.choice(STATES),
+        'Claim Amount': str(rng.choice([8000, 25000, 42000, 65000]))
+    }
+
+
+# --- Minimal PDF writer -------------------------------------------------------
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _wrap(text, width=90):
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def write_text_pdf(path, pages):
+    """Write one Helvetica text page per string in `pages` (ASCII only)"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for text in pages:
+        lines = _wrap(text)[:60]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 750 Td"]
+        for line in lines:
+            ops.append(f"({_pdf_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = '\n'.join(ops).encode('latin-1', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                        f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_ref} 0 R >>").encode())
+        page_refs.append(len(objects))
+    kids = ' '.join(f"{ref} 0 R" for ref in page_refs)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    with open(path, 'wb') as f:
+        f.write(out)
@@ -0,0 +1,286 @@
+"""Production entry point: preload once, fork workers.
+
+The parent imports the app (loading the models and the policy index),
+freezes the GC so those objects stay in shared copy-on-write pages, binds
+the listening socket and forks N workers. Each worker serves the shared
+socket with a bounded thread pool, with debug mode and the reloader off.
+Workers retire after --max-requests (plus jitter) and the parent forks a
+replacement, so slow leaks never build up.
+
+Signals to the parent:
+    SIGTERM / SIGINT   graceful shutdown (in-flight requests finish)
+    SIGHUP             load the newest index snapshot in the parent, then
+                       replace workers one at a time
+
+Each worker has its own in-memory index, so use SIGHUP rather than
+POST /api/reload-index (which only swaps the worker that handled it).
+The same goes for POST /api/upload-policy: the worker that indexed the
+upload serves it straight away and saves it as a new snapshot; SIGHUP
+brings the other workers onto that snapshot.
+/api/metrics and /api/memory also report per worker.
+
+Usage (from app/backend):
+    python serve.py --workers 4 --threads 8 --port 5000
+"""
+import argparse
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server handling connections on a fixed-size thread pool.
+
+    The accept loop blocks once every thread is busy, leaving further
+    connections in the shared backlog for less loaded workers; it re-checks
+    for stop() while it waits, so SIGTERM is not stuck behind slow requests.
+    After `max_requests` the server stops accepting and drains.
+    """
+
+    multithread = True
+
+    def __init__(self, host, app, fd, threads, max_requests=0):
+        super().__init__(host, 0, app, fd=fd)
+        self.threads = threads
+        self.max_requests = max_requests
+        self.handled = 0
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+        self._slots = threading.BoundedSemaphore(threads)
+        self._count_lock = threading.Lock()
+        self._stopping = False
+
+    def process_request(self, request, client_address):
+        acquired = False
+        while not acquired and not self._stopping:
+            acquired = self._slots.acquire(timeout=0.5)
+        # When stopping, a connection already accepted is still queued and served during drain()
+        self._pool.submit(self._handle, request, client_address, acquired)
+
+    def _handle(self, request, client_address, slot=True):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            if slot:
+                self._slots.release()
+            with self._count_lock:
+                self.handled += 1
+                retire = self.max_requests and self.handled >= self.max_requests
+            if retire:
+                self.stop()
+
+    def stop(self):
+        """Stop accepting; serve_forever() returns once the loop notices"""
+        if not self._stopping:
+            self._stopping = True
+            # shutdown() waits for serve_forever, so it must run off the serving thread
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def drain(self):
+        self._pool.shutdown(wait=True)
+
+
+class Arbiter:
+    """Parent process: forks, watches and replaces workers"""
+
+    def __init__(self, args, app_module, listener):
+        self.args = args
+        self.app_module = app_module
+        self.listener = listener
+        self.workers = {}           # pid -> worker number
+        self._reload_requested = False
+        self._stopping = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_hup)
+
+        for number in range(self.args.workers):
+            self.spawn(number)
+
+        while not self._stopping:
+            if self._reload_requested:
+                self._reload_requested = False
+                self.rolling_restart()
+            self.reap()
+            time.sleep(0.5)
+        self.shutdown()
+
+    def spawn(self, number):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(self.app_module, self.listener, self.args, number)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        self.workers[pid] = number
+        print(f"👷 Worker {number} started (pid {pid})")
+        return pid
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            number = self.workers.pop(pid, None)
+            if number is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if not self._stopping:
+                reason = 'recycled' if code == 0 else f'exited with {code}'
+                print(f"♻️ Worker {number} (pid {pid}) {reason}, starting a replacement")
+                if code != 0:
+                    time.sleep(1)   # don't spin if workers crash on start
+                self.spawn(number)
+
+    def rolling_restart(self):
+        """Reload the index in the parent, then replace workers one by one"""
+        try:
+            version = self.app_module.index_manager.reload()
+            print(f"🔄 Parent loaded index snapshot {version}")
+        except Exception as e:
+            print(f"⚠️ Index reload failed, restarting workers on the current index: {e}")
+        gc.collect()
+        gc.freeze()
+
+        for pid, number in list(self.workers.items()):
+            self.spawn(number)
+            self._stop_worker(pid)
+            del self.workers[pid]
+
+    def _stop_worker(self, pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while time.monotonic() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                return
+            time.sleep(0.1)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    def shutdown(self):
+        print("🛑 Stopping workers...")
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.workers.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.workers:
+            os.kill(pid, signal.SIGKILL)
+        self.listener.close()
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_hup(self, signum, frame):
+        self._reload_requested = True
+
+
+def run_worker(app_module, listener, args, number):
+    """Serve requests in a forked child until recycled or told to stop"""
+    for sig in (signal.SIGINT, signal.SIGHUP):
+        signal.signal(sig, signal.SIG_IGN)
+
+    # Split the cores between workers instead of every worker using all of them
+    try:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.workers))
+    except ImportError:
+        pass
+
+    jitter = random.randint(0, args.max_requests_jitter) if args.max_requests else 0
+    server = PooledWSGIServer(args.host, app_module.app, listener.fileno(), args.threads,
+                              max_requests=args.max_requests + jitter if args.max_requests else 0)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+
+    app_module.log.info("Worker %d serving with %d threads", number, args.threads,
+                        extra={'pid': os.getpid(), 'max_requests': server.max_requests})
+    server.serve_forever()
+    server.drain()
+    app_module.log.info("Worker %d stopped after %d requests", number, server.handled)
+
+    from services.log_setup import stop_logging
+    stop_logging()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preforking production server for the assistant API")
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', 2)),
+                        help="Worker processes")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 8)),
+                        help="Request threads per worker")
+    parser.add_argument('--max-requests', type=int, default=5000,
+                        help="Recycle a worker after this many requests (0 = never)")
+    parser.add_argument('--max-requests-jitter', type=int, default=500,
+                        help="Random extra requests per worker so they don't all recycle together")
+    parser.add_argument('--graceful-timeout', type=float, default=30,
+                        help="Seconds a stopping worker gets to finish in-flight requests")
+    parser.add_argument('--backlog', type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, 'fork'):
+        print("❌ serve.py needs fork(); on this platform run app.py instead")
+        return 1
+
+    # Preload: models, index and precedents are loaded once, here
+    import app as app_module
+    app_module.app.debug = False
+
+    from services import log_setup
+    os.register_at_fork(after_in_child=log_setup.restart_after_fork)
+    os.register_at_fork(after_in_child=lambda: app_module.precedent_writer.reset_after_fork())
+    os.register_at_fork(after_in_child=lambda: [encoder.reset_after_fork()
+                                                 for encoder in app_module.index_manager.query_encoders()])
+    os.register_at_fork(after_in_child=lambda: app_module.ingestion_queue.reset_after_fork())
+
+    listener = socket.socket(socket.AF_INET6 if ':' in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(args.backlog)
+
+    # Objects created so far are long-lived; keep the collector from touching (and copying) them
+    gc.collect()
+    gc.freeze()
+
+    print(f"🚀 Serving on http://{args.host}:{args.port} with {args.workers} workers x {args.threads} threads")
+    Arbiter(args, app_module, listener).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from services.metrics import metrics
+
+
+class Overloaded(Exception):
+    """Raised when a call cannot be admitted; callers degrade or answer 503"""
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded wait queue.
+
+    At most `max_concurrent` callers run at once. Up to `max_queue` more
+    wait, each for at most `max_wait` seconds; anyone beyond that, or whose
+    wait runs out, gets Overloaded straight away instead of adding to the
+    pile-up. In-flight count, queue depth and wait times go to the metrics
+    registry.
+    """
+
+    def __init__(self, name, max_concurrent=4, max_queue=16, max_wait=2.0):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def admit(self):
+        started = time.perf_counter()
+        with self._cond:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    self._reject('queue full')
+                self.waiting += 1
+                self._publish()
+                try:
+                    deadline = started + self.max_wait
+                    while self.active >= self.max_concurrent:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0 or not self._cond.wait(remaining):
+                            if self.active >= self.max_concurrent:
+                                self._reject(f'no slot within {self.max_wait}s')
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            self._publish()
+        metrics.observe('admission_wait_seconds', time.perf_counter() - started, gate=self.name)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._publish()
+                self._cond.notify()
+
+    def saturated(self):
+        """True when a new caller would be turned away right now"""
+        with self._cond:
+            return self.active >= self.max_concurrent and self.waiting >= self.max_queue
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'max_wait_s': self.max_wait,
+                'in_flight': self.active,
+                'queue_depth': self.waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected
+            }
+
+    def _reject(self, reason):
+        # Called with the condition held
+        self.rejected += 1
+        metrics.inc('admission_rejected_total', gate=self.name)
+        self._publish()
+        raise Overloaded(f"{self.name} overloaded: {reason}")
+
+    def _publish(self):
+        metrics.set_gauge('admission_in_flight', self.active, gate=self.name)
+        metrics.set_gauge('admission_queue_depth', self.waiting, gate=self.name)
+
+
+class AdmittedEncoder:
+    """Query encoder wrapper: every encode() first passes the admission controller"""
+
+    def __init__(self, encoder, controller):
+        self.encoder = encoder
+        self.controller = controller
+
+    def encode(self, sentences, **kwargs):
+        with self.controller.admit():
+            return self.encoder.encode(sentences, **kwargs)
+
+    def __getattr__(self, name):
+        # stats(), reset_after_fork() etc. of the wrapped encoder
+        return getattr(self.encoder, name)
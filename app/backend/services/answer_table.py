@@ -0,0 +1,144 @@
+import json
+import os
+from itertools import product
+
+import numpy as np
+
+from services.precedent_retriever import PrecedentRetriever
+
+TABLE_FILE = 'answer_table.json'
+PRECEDENT_VECTORS_FILE = 'precedent_query_embeddings.npy'
+
+# The front end's dropdown values
+CLAIM_TYPES = ['Car Insurance', 'EV Insurance', 'Flood Insurance', 'Health Insurance', 'Fire Insurance']
+STATES = ['California', 'Texas', 'Florida']
+
+# One amount per band the queries distinguish: precedent queries change at 20000 and 50000,
+# policy queries and criticality at 30000 (LARGE_CLAIM_THRESHOLD); None = no amount given
+BAND_AMOUNTS = [None, '15000', '25000', '40000', '60000']
+
+
+class AnswerTable:
+    """Precomputed policy hits and precedent query vectors for every dropdown combination.
+
+    Built with the index and stored in its snapshot, so it always matches
+    the chunks it points at. Lookups go by the generated query text rather
+    than by the case fields: whatever context produces the same queries
+    gets the same answer as a live search would, with no model call.
+    """
+
+    def __init__(self, policy_hits=None, precedent_queries=None, precedent_vectors=None, precedent_model=None):
+        self.policy_hits = policy_hits or {}              # query-list key -> [[chunk idx, score], ...]
+        self.precedent_queries = precedent_queries or []  # precedent query texts, row order of the vectors
+        self.precedent_vectors = precedent_vectors
+        self.precedent_model = precedent_model            # embedding model that encoded the vectors
+        self._precedent_rows = {text: row for row, text in enumerate(self.precedent_queries)}
+
+    @staticmethod
+    def combinations():
+        for claim_type, state, amount in product(CLAIM_TYPES, STATES, BAND_AMOUNTS):
+            context = {'claim_type': claim_type, 'state': state}
+            if amount is not None:
+                context['claim_amount'] = amount
+            yield context
+
+    @staticmethod
+    def policy_key(queries, partitions=None):
+        if partitions:
+            return json.dumps([list(queries), list(partitions)])
+        return json.dumps(list(queries))
+
+    @classmethod
+    def build(cls, retriever, context_parser, max_queries=3, top_k=3):
+        """Run every combination through `retriever` (full semantic search, no budget)"""
+        # Encode with the model directly: a build must not be batched with, or shed like, live traffic
+        query_encoder, retriever.query_encoder = retriever.query_encoder, None
+        try:
+            return cls._build(retriever, context_parser, max_queries, top_k)
+        finally:
+            retriever.query_encoder = query_encoder
+
+    @classmethod
+    def _build(cls, retriever, context_parser, max_queries, top_k):
+        policy_hits = {}
+        precedent_queries = []
+        for context in cls.combinations():
+            queries = context_parser.build_query_from_context(context)[:max_queries]
+            partitions = retriever.route(context['claim_type'])
+            key = cls.policy_key(queries, partitions)
+            if key not in policy_hits:
+                hits = []
+                for query in queries:
+                    if query and isinstance(query, str) and query.strip():
+                        hits.extend(retriever.search_in_documents(query, top_k=top_k, partitions=partitions))
+                replayable = cls._chunk_refs(hits, retriever.chunks)
+                if replayable is not None:
+                    policy_hits[key] = replayable
+
+            precedent_query = PrecedentRetriever._create_query_from_context(context)
+            if precedent_query not in precedent_queries:
+                precedent_queries.append(precedent_query)
+
+        precedent_vectors = None
+        if retriever.model is not None:
+            precedent_vectors = np.asarray(retriever.model.encode(precedent_queries, show_progress_bar=False),
+                                           dtype=np.float32)
+        print(f"✅ Answer table: {len(policy_hits)} policy query sets, {len(precedent_queries)} precedent queries")
+        return cls(policy_hits, precedent_queries, precedent_vectors, retriever.embedding_model)
+
+    @staticmethod
+    def _chunk_refs(hits, chunks):
+        """[[chunk idx, score], ...] for index hits; None if any hit can't be replayed (mock results)"""
+        refs = []
+        for hit in hits:
+            idx = chunks.find(hit.get('chunk_hash'))
+            # Short content hashes can collide; only keep hits that point at the same text
+            if idx is None or chunks.text_at(idx) != hit.get('content'):
+                return None
+            refs.append([idx, hit['relevance_score']])
+        return refs
+
+    def lookup_policies(self, queries, chunks, partitions=None):
+        """Merged search results for these queries (on these partitions), or None if they were not precomputed"""
+        hits = self.policy_hits.get(self.policy_key(queries, partitions))
+        if hits is None:
+            return None
+        return [chunks.result(idx, score) for idx, score in hits]
+
+    def precedent_vector(self, query_text, embedding_model):
+        """(1, dim) precomputed embedding of a precedent query, or None.
+        
+        Only for a precedent index of the same `embedding_model`: vectors from
+        another model can have the same size and still be meaningless there.
+        """
+        row = self._precedent_rows.get(query_text)
+        if row is None or self.precedent_vectors is None or embedding_model != self.precedent_model:
+            return None
+        return self.precedent_vectors[row:row + 1]
+
+    def save(self, snapshot_dir):
+        with open(os.path.join(snapshot_dir, TABLE_FILE), 'w') as f:
+            json.dump({'policy_hits': self.policy_hits, 'precedent_queries': self.precedent_queries,
+                       'precedent_model': self.precedent_model}, f)
+        if self.precedent_vectors is not None:
+            np.save(os.path.join(snapshot_dir, PRECEDENT_VECTORS_FILE), self.precedent_vectors)
+
+    @classmethod
+    def load(cls, snapshot_dir):
+        """The table stored in a snapshot, or None for snapshots built without one"""
+        path = os.path.join(snapshot_dir, TABLE_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            data = json.load(f)
+        vectors_path = os.path.join(snapshot_dir, PRECEDENT_VECTORS_FILE)
+        vectors = np.load(vectors_path) if os.path.exists(vectors_path) else None
+        return cls(data.get('policy_hits'), data.get('precedent_queries'), vectors, data.get('precedent_model'))
+
+    def stats(self):
+        return {
+            'policy_query_sets': len(self.policy_hits),
+            'precedent_queries': len(self.precedent_queries),
+            'precedent_vectors': self.precedent_vectors is not None,
+            'precedent_model': self.precedent_model
+        }
@@ -0,0 +1,122 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import numpy as np
+
+from services.metrics import metrics, inline_work_requested
+
+
+class BatchingEncoder:
+    """Micro-batches query encodes from all request threads into one forward pass.
+
+    Callers use encode() like SentenceTransformer.encode(). Each call queues
+    its texts and waits on a future; a single encoder thread collects
+    whatever arrives within `max_wait_ms` (up to `max_batch_size` texts),
+    runs one batched model.encode() and hands each caller its rows.
+    Only meant for short query texts - corpus encoding keeps using the
+    model directly.
+    """
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0, timeout=10.0):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout
+        self.batches = 0
+        self.texts_encoded = 0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def encode(self, sentences, **kwargs):
+        """Return a (len(sentences), dim) float32 array; extra kwargs are ignored"""
+        if isinstance(sentences, str):
+            return self.encode([sentences])[0]
+        sentences = list(sentences)
+        if not sentences:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        if inline_work_requested():
+            # Profiled request: encode on this thread so the profile sees the model's time
+            return np.asarray(self.model.encode(sentences, batch_size=len(sentences), show_progress_bar=False),
+                              dtype=np.float32)
+        future = self.submit(sentences)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise
+
+    def submit(self, sentences):
+        """Queue texts for the next batch; the future resolves to their vectors"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((list(sentences), future))
+        return future
+
+    def reset_after_fork(self):
+        """Give a forked child its own queue; the encoder thread restarts on the next encode"""
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'texts_encoded': self.texts_encoded,
+            'mean_batch_size': round(self.texts_encoded / self.batches, 2) if self.batches else 0.0,
+            'pending': self._queue.qsize()
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='query-encoder', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch):
+        # Callers that gave up (timed out) have a cancelled future; skip their texts
+        batch = [(texts, future) for texts, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for item_texts, _ in batch for text in item_texts]
+        try:
+            with metrics.span('query_encode_batch'):
+                vectors = np.asarray(self.model.encode(texts, batch_size=len(texts), show_progress_bar=False),
+                                     dtype=np.float32)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.texts_encoded += len(texts)
+        metrics.inc('query_encode_batches_total')
+        metrics.inc('query_encode_texts_total', len(texts))
+        offset = 0
+        for item_texts, future in batch:
+            future.set_result(vectors[offset:offset + len(item_texts)])
+            offset += len(item_texts)
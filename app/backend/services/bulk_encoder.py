@@ -0,0 +1,127 @@
+import hashlib
+import math
+import multiprocessing
+import os
+import shutil
+import time
+
+import numpy as np
+
+# Model loaded once per worker process by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_name, torch_threads):
+    global _worker_model
+    try:
+        import torch
+        # Keep workers from oversubscribing the CPU between them
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_shard(task):
+    shard_id, texts = task
+    vectors = _worker_model.encode(texts, batch_size=64, show_progress_bar=False)
+    return shard_id, np.asarray(vectors, dtype=np.float32)
+
+
+class BulkEncoder:
+    """Checkpointed corpus encoding across a pool of CPU worker processes.
+
+    The corpus is cut into fixed-size shards. Each finished shard is saved
+    to `shard_dir` under a key derived from the model and the corpus
+    content, so an interrupted build resumes from the shards already on
+    disk instead of starting over.
+    """
+
+    def __init__(self, model_name, shard_dir, batch_size=512, workers=None, keep_shards=False,
+                 model=None):
+        self.model_name = model_name
+        self.model = model              # reused for in-process encoding (workers=1)
+        self.shard_dir = shard_dir
+        self.batch_size = batch_size
+        self.workers = workers if workers is not None else max(1, (os.cpu_count() or 2) - 1)
+        self.keep_shards = keep_shards
+        self.last_stats = {}
+
+    def encode(self, texts):
+        """Return a float32 (len(texts), dim) embedding matrix"""
+        texts = list(texts)
+        shard_root = os.path.join(self.shard_dir, self._corpus_key(texts))
+        os.makedirs(shard_root, exist_ok=True)
+
+        shard_count = math.ceil(len(texts) / self.batch_size)
+        pending = [i for i in range(shard_count) if not os.path.exists(self._shard_path(shard_root, i))]
+        if len(pending) < shard_count:
+            print(f"♻️ Resuming encode: {shard_count - len(pending)}/{shard_count} shards already done")
+
+        started = time.time()
+        encoded = 0
+        tasks = ((i, texts[i * self.batch_size:(i + 1) * self.batch_size]) for i in pending)
+
+        if pending:
+            workers = min(self.workers, len(pending))
+            print(f"🔧 Encoding {len(texts)} chunks in {len(pending)} shards on {workers} worker(s)...")
+            if workers > 1:
+                torch_threads = max(1, (os.cpu_count() or workers) // workers)
+                ctx = multiprocessing.get_context('spawn')
+                with ctx.Pool(workers, initializer=_init_worker,
+                              initargs=(self.model_name, torch_threads)) as pool:
+                    for shard_id, vectors in pool.imap_unordered(_encode_shard, tasks):
+                        encoded += self._save_shard(shard_root, shard_id, vectors, started, encoded)
+            else:
+                model = self.model
+                if model is None:
+                    from sentence_transformers import SentenceTransformer
+                    model = SentenceTransformer(self.model_name)
+                for shard_id, shard_texts in tasks:
+                    vectors = np.asarray(model.encode(shard_texts, batch_size=64, show_progress_bar=False),
+                                         dtype=np.float32)
+                    encoded += self._save_shard(shard_root, shard_id, vectors, started, encoded)
+
+        embeddings = np.concatenate(
+            [np.load(self._shard_path(shard_root, i)) for i in range(shard_count)]
+        ) if shard_count else np.zeros((0, 0), dtype=np.float32)
+
+        elapsed = time.time() - started
+        self.last_stats = {
+            'chunks': len(texts),
+            'shards': shard_count,
+            'resumed_shards': shard_count - len(pending),
+            'encoded_chunks': encoded,
+            'seconds': round(elapsed, 2),
+            'chunks_per_sec': round(encoded / elapsed, 1) if elapsed > 0 else None
+        }
+        print(f"✅ Encoded {encoded} chunks in {elapsed:.1f}s "
+              f"({self.last_stats['chunks_per_sec']} chunks/sec)")
+
+        if not self.keep_shards:
+            shutil.rmtree(shard_root, ignore_errors=True)
+        return embeddings
+
+    def _save_shard(self, shard_root, shard_id, vectors, started, encoded_before):
+        path = self._shard_path(shard_root, shard_id)
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, vectors)
+        os.replace(tmp_path, path)
+
+        done = encoded_before + len(vectors)
+        elapsed = time.time() - started
+        rate = done / elapsed if elapsed > 0 else 0
+        print(f"  💾 Shard {shard_id} done ({len(vectors)} chunks, {rate:.1f} chunks/sec overall)")
+        return len(vectors)
+
+    @staticmethod
+    def _shard_path(shard_root, shard_id):
+        return os.path.join(shard_root, f"shard_{shard_id:05d}.npy")
+
+    def _corpus_key(self, texts):
+        """Same model + same texts + same batch size -> same shard directory"""
+        digest = hashlib.sha256(f"{self.model_name}|{self.batch_size}|{len(texts)}".encode())
+        for text in texts:
+            digest.update(hashlib.md5(text.encode('utf-8')).digest())
+        return digest.hexdigest()[:16]
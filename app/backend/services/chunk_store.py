@@ -0,0 +1,221 @@
+import json
+import os
+import sys
+from array import array
+
+
+class ChunkStore:
+    """Columnar storage for indexed policy chunks.
+
+    Instead of one dict and one str per chunk, every column is a compact
+    array: interned source IDs, page numbers, raw md5 digests, and all
+    chunk text in a single UTF-8 buffer addressed by offsets. Result dicts
+    are only materialised for the hits a search actually returns.
+    """
+
+    DIGEST_SIZE = 16  # raw md5 bytes
+    HASH_BYTES = 4    # digest prefix shown as chunk_hash
+    ARRAY_COLUMNS = ('source_ids', 'pages', 'offsets', 'flags', 'char_starts', 'char_ends')
+    OPTIONAL_COLUMNS = ('flags', 'char_starts', 'char_ends')
+
+    def __init__(self):
+        self.sources = []            # source id -> PDF filename
+        self.source_paths = []       # source id -> full pdf_path
+        self._source_index = {}      # pdf_path -> source id
+
+        self.source_ids = array('i')
+        self.pages = array('i')
+        self.flags = array('B')      # criticality bit flags (see citation_builder)
+        self.char_starts = array('i')  # chunk span within its page text
+        self.char_ends = array('i')
+        self.offsets = array('q', [0])
+        self.text = bytearray()
+        self.digests = bytearray()
+
+        # Extra citation locations for deduplicated chunks: idx -> [(source id, page)]
+        self.extra_locations = {}
+
+        self._hash_index = None      # (chunk count, {chunk_hash: idx}), built on first find()
+
+    def __len__(self):
+        return len(self.pages)
+
+    def add_source(self, source, pdf_path):
+        """Intern a source document and return its integer ID"""
+        source_id = self._source_index.get(pdf_path)
+        if source_id is None:
+            source_id = len(self.sources)
+            self._source_index[pdf_path] = source_id
+            self.sources.append(source)
+            self.source_paths.append(pdf_path)
+        return source_id
+
+    def append(self, text, source_id, page, digest, flags=0, char_start=0, char_end=None):
+        """Add a chunk and return its index"""
+        encoded = text.encode('utf-8')
+        self.text.extend(encoded)
+        self.offsets.append(len(self.text))
+        self.source_ids.append(source_id)
+        self.pages.append(page)
+        self.flags.append(flags)
+        self.char_starts.append(char_start)
+        self.char_ends.append(char_start + len(text) if char_end is None else char_end)
+        self.digests.extend(digest)
+        return len(self.pages) - 1
+
+    def copy(self):
+        """Independent copy (for building a successor index while this one serves searches)"""
+        store = ChunkStore()
+        store.sources = list(self.sources)
+        store.source_paths = list(self.source_paths)
+        store._source_index = dict(self._source_index)
+        for name in self.ARRAY_COLUMNS:
+            column = getattr(self, name)
+            setattr(store, name, array(column.typecode, column))
+        store.text = bytearray(self.text)
+        store.digests = bytearray(self.digests)
+        store.extra_locations = {idx: list(entries) for idx, entries in self.extra_locations.items()}
+        return store
+
+    def digest_index(self):
+        """Full md5 digest -> chunk index, for deduplicating newly added text"""
+        size = self.DIGEST_SIZE
+        return {bytes(self.digests[idx * size:(idx + 1) * size]): idx for idx in range(len(self))}
+
+    def add_location(self, idx, source_id, page):
+        """Record that chunk `idx` also appears at another source/page"""
+        self.extra_locations.setdefault(idx, []).append((source_id, page))
+
+    def ensure_flags(self, compute_flags):
+        """Fill in the flags column if it is missing (snapshots built before flags existed)"""
+        if len(self.flags) != len(self):
+            self.flags = array('B', (compute_flags(text) for text in self.iter_texts()))
+
+    def text_at(self, idx):
+        return self.text[self.offsets[idx]:self.offsets[idx + 1]].decode('utf-8')
+
+    def iter_texts(self):
+        for idx in range(len(self.pages)):
+            yield self.text_at(idx)
+
+    def source_at(self, idx):
+        return self.sources[self.source_ids[idx]]
+
+    def pdf_path_at(self, idx):
+        return self.source_paths[self.source_ids[idx]]
+
+    def chunk_hash(self, idx):
+        start = idx * self.DIGEST_SIZE
+        return self.digests[start:start + self.HASH_BYTES].hex()
+
+    def find(self, chunk_hash):
+        """Index of the chunk with exactly this chunk_hash (as result() emits it), or None"""
+        if not isinstance(chunk_hash, str) or len(chunk_hash) != self.HASH_BYTES * 2:
+            return None
+        hash_index = self._hash_index
+        if hash_index is None or hash_index[0] != len(self):
+            # Built once per store (again only if chunks were appended since); first chunk wins on collisions
+            lookup = {}
+            for idx in range(len(self) - 1, -1, -1):
+                lookup[self.chunk_hash(idx)] = idx
+            hash_index = self._hash_index = (len(self), lookup)
+        return hash_index[1].get(chunk_hash.lower())
+
+    def locations(self, idx):
+        """All source/page locations of a chunk, first occurrence first"""
+        entries = [(self.source_ids[idx], self.pages[idx])]
+        entries.extend(self.extra_locations.get(idx, ()))
+        return [{
+            'source': self.sources[source_id],
+            'page': page,
+            'pdf_path': self.source_paths[source_id]
+        } for source_id, page in entries]
+
+    def result(self, idx, score):
+        """Build the search result dict for one hit"""
+        return {
+            'content': self.text_at(idx),
+            'source': self.source_at(idx),
+            'page': self.pages[idx],
+            'pdf_path': self.pdf_path_at(idx),
+            'chunk_hash': self.chunk_hash(idx),
+            'flags': self.flags[idx],
+            'char_start': self.char_starts[idx],
+            'char_end': self.char_ends[idx],
+            'locations': self.locations(idx),
+            'relevance_score': score,
+            'type': 'policy'
+        }
+
+    def memory_usage(self):
+        """Bytes held by each part of the store"""
+        columns = {name: len(getattr(self, name)) * getattr(self, name).itemsize for name in self.ARRAY_COLUMNS}
+        metadata = sum(columns.values()) + len(self.digests)
+        metadata += sum(sys.getsizeof(s) for s in self.sources + self.source_paths)
+        metadata += sys.getsizeof(self._source_index) + sys.getsizeof(self.extra_locations)
+        metadata += sum(sys.getsizeof(entries) + len(entries) * sys.getsizeof((0, 0))
+                        for entries in self.extra_locations.values())
+        return {
+            'chunk_text_bytes': len(self.text),
+            'digest_bytes': len(self.digests),
+            'column_bytes': columns,
+            'metadata_bytes': metadata
+        }
+
+    def save(self, directory):
+        """Write every column to `directory` as raw arrays plus a small JSON header"""
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAY_COLUMNS:
+            with open(os.path.join(directory, f"{name}.bin"), 'wb') as f:
+                getattr(self, name).tofile(f)
+        for name in ('text', 'digests'):
+            with open(os.path.join(directory, f"{name}.bin"), 'wb') as f:
+                f.write(getattr(self, name))
+
+        header = {
+            'chunk_count': len(self),
+            'typecodes': {name: getattr(self, name).typecode for name in self.ARRAY_COLUMNS},
+            'itemsizes': {name: getattr(self, name).itemsize for name in self.ARRAY_COLUMNS},
+            'sources': self.sources,
+            'source_paths': self.source_paths,
+            'extra_locations': [[idx, source_id, page]
+                                for idx, entries in self.extra_locations.items()
+                                for source_id, page in entries]
+        }
+        with open(os.path.join(directory, 'chunks.json'), 'w') as f:
+            json.dump(header, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Rebuild a store previously written with save()"""
+        with open(os.path.join(directory, 'chunks.json'), 'r') as f:
+            header = json.load(f)
+
+        store = cls()
+        for source, pdf_path in zip(header['sources'], header['source_paths']):
+            store.add_source(source, pdf_path)
+
+        for name in cls.ARRAY_COLUMNS:
+            column = array(header['typecodes'].get(name, 'B'))
+            if name in header['itemsizes'] and column.itemsize != header['itemsizes'][name]:
+                raise ValueError(f"Snapshot column {name} was written with a different item size")
+            path = os.path.join(directory, f"{name}.bin")
+            if not os.path.exists(path) and name in cls.OPTIONAL_COLUMNS:
+                continue  # Older snapshot, filled in below or by ensure_flags()
+            with open(path, 'rb') as f:
+                column.frombytes(f.read())
+            setattr(store, name, column)
+        for name in ('text', 'digests'):
+            with open(os.path.join(directory, f"{name}.bin"), 'rb') as f:
+                setattr(store, name, bytearray(f.read()))
+
+        for idx, source_id, page in header['extra_locations']:
+            store.add_location(idx, source_id, page)
+
+        if len(store) != header['chunk_count'] or len(store.offsets) != len(store) + 1:
+            raise ValueError("Snapshot chunk columns are inconsistent")
+        if len(store.char_starts) != len(store):
+            # Snapshots from before sliding-window chunking held whole pages
+            store.char_starts = array('i', [0] * len(store))
+            store.char_ends = array('i', (len(text) for text in store.iter_texts()))
+        return store
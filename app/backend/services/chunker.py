@@ -0,0 +1,91 @@
+import re
+
+
+class SlidingWindowChunker:
+    """Split page text into overlapping windows that fit the encoder's input.
+
+    MiniLM truncates anything past its max sequence length, so a whole
+    page per chunk wastes tokenization and never embeds late clauses.
+    Windows are measured in tokenizer tokens (falling back to an estimate
+    from whitespace words when no tokenizer is available) and carry their
+    page number and character offsets within the page. Pages are consumed
+    one at a time, so memory per document stays bounded by one page.
+    """
+
+    WORD_PATTERN = re.compile(r'\S+')
+    SPECIAL_TOKENS = 2              # [CLS] and [SEP] added by the encoder
+    TOKENS_PER_WORD_ESTIMATE = 1.3  # WordPiece splits, used without a tokenizer
+
+    def __init__(self, tokenizer=None, window_tokens=254, overlap_tokens=32):
+        if window_tokens <= 0:
+            raise ValueError("window_tokens must be positive")
+        if not 0 <= overlap_tokens < window_tokens:
+            raise ValueError("overlap_tokens must be between 0 and window_tokens")
+        self.tokenizer = tokenizer
+        self.window_tokens = window_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @classmethod
+    def for_model(cls, model, window_tokens=None, overlap_tokens=32):
+        """Chunker sized to a SentenceTransformer's max sequence length"""
+        tokenizer = getattr(model, 'tokenizer', None) if model is not None else None
+        if window_tokens is None:
+            max_seq_length = getattr(model, 'max_seq_length', None) or 256
+            window_tokens = max_seq_length - cls.SPECIAL_TOKENS
+        return cls(tokenizer, window_tokens, min(overlap_tokens, window_tokens // 2))
+
+    def chunk_pages(self, pages):
+        """Yield chunks from an iterable of (page_number, text) pairs"""
+        for page_num, text in pages:
+            yield from self.chunk_page(text, page_num)
+
+    def chunk_page(self, text, page_num):
+        """Yield {'text', 'page', 'char_start', 'char_end'} windows for one page"""
+        spans = self._token_spans(text)
+        if not spans:
+            return
+
+        window, step = self._window_and_step()
+        start = 0
+        while True:
+            end = min(start + window, len(spans))
+            char_start, char_end = spans[start][0], spans[end - 1][1]
+            yield {
+                'text': text[char_start:char_end],
+                'page': page_num,
+                'char_start': char_start,
+                'char_end': char_end
+            }
+            if end >= len(spans):
+                break
+            start += step
+
+    def _window_and_step(self):
+        if self._has_offset_tokenizer():
+            window, overlap = self.window_tokens, self.overlap_tokens
+        else:
+            # Spans are words here, so shrink the window to stay under the token limit
+            window = max(1, int(self.window_tokens / self.TOKENS_PER_WORD_ESTIMATE))
+            overlap = min(window - 1, int(self.overlap_tokens / self.TOKENS_PER_WORD_ESTIMATE))
+        return window, window - overlap
+
+    def _has_offset_tokenizer(self):
+        return self.tokenizer is not None and getattr(self.tokenizer, 'is_fast', False)
+
+    def _token_spans(self, text):
+        """(char_start, char_end) of every token in `text`"""
+        if not text:
+            return []
+        if self._has_offset_tokenizer():
+            try:
+                encoded = self.tokenizer(
+                    text,
+                    add_special_tokens=False,
+                    return_offsets_mapping=True,
+                    verbose=False
+                )
+                return [(s, e) for s, e in encoded['offset_mapping'] if e > s]
+            except Exception as e:
+                print(f"⚠️ Tokenizer offsets unavailable, chunking by words: {e}")
+                self.tokenizer = None
+        return [(m.start(), m.end()) for m in self.WORD_PATTERN.finditer(text)]
@@ -1,3 +1,18 @@
+from services.keyword_matcher import KeywordMatcher
+
+# Bit flags stored per chunk in the index
+FLAG_CRITICAL_KEYWORD = 1
+FLAG_LARGE_AMOUNT = 2
+
+LARGE_CLAIM_THRESHOLD = 30000
+
+CRITICAL_KEYWORDS = ['must', 'required', 'mandatory', 'shall', 'prohibited']
+AMOUNT_KEYWORDS = ['$30,000', '30000', 'thirty thousand', 'large claim']
+
+_criticality_matcher = KeywordMatcher({
+    **{keyword: FLAG_CRITICAL_KEYWORD for keyword in CRITICAL_KEYWORDS},
+    **{keyword: FLAG_LARGE_AMOUNT for keyword in AMOUNT_KEYWORDS}
+})
 
 class CitationBuilder:
     @staticmethod
@@ -17,9 +32,38 @@ class CitationBuilder:
             print(f"⚠️ Error formatting citation: {e}")
             return "Source document"
     
+    @staticmethod
+    def compute_flags(text):
+        """Criticality bit flags for a chunk - computed once at index time"""
+        if not isinstance(text, str):
+            return 0
+        return _criticality_matcher.match_flags(text)
+    
+    @staticmethod
+    def criticality_mask(case_context):
+        """Flags that make a policy critical for this case"""
+        mask = FLAG_CRITICAL_KEYWORD
+        try:
+            claim_amount = case_context.get('claim_amount', '0')
+            
+            # Handle different types
+            if isinstance(claim_amount, str):
+                # Remove $ and commas
+                amount_str = claim_amount.replace('$', '').replace(',', '').strip()
+            else:
+                amount_str = str(claim_amount)
+            
+            # High-value claims also care about policies mentioning large amounts
+            if amount_str and amount_str != '0' and float(amount_str) > LARGE_CLAIM_THRESHOLD:
+                mask |= FLAG_LARGE_AMOUNT
+        except (ValueError, TypeError, AttributeError):
+            # Skip if conversion fails
+            pass
+        return mask
+    
     @staticmethod
     def highlight_critical_policy(policies, case_context):
-        """Identify and highlight critical policies - SIMPLE VERSION (no NumPy)"""
+        """Identify and highlight critical policies - returns new dicts, inputs are not modified"""
         if not policies:
             return []
         
@@ -33,50 +77,20 @@ class CitationBuilder:
             except:
                 case_context = {}
         
-        critical_keywords = ['must', 'required', 'mandatory', 'shall', 'prohibited']
-        amount_keywords = ['$30,000', '30000', 'thirty thousand', 'large claim']
+        mask = CitationBuilder.criticality_mask(case_context)
         
+        highlighted = []
         for policy in policies:
-            policy['critical'] = False
-            
-            # Get content safely
-            content = policy.get('content', '')
-            if not isinstance(content, str):
-                continue
-            
-            content_lower = content.lower()
-            
-            # Check for critical keywords (SIMPLE - no NumPy)
-            for keyword in critical_keywords:
-                if keyword in content_lower:
-                    policy['critical'] = True
-                    break
+            flags = policy.get('flags')
+            if flags is None:
+                # Mock/legacy results were not tagged at index time
+                flags = CitationBuilder.compute_flags(policy.get('content', ''))
             
-            # Check for high-value claims
-            try:
-                claim_amount = case_context.get('claim_amount', '0')
-                
-                # Handle different types
-                if isinstance(claim_amount, str):
-                    # Remove $ and commas
-                    amount_str = claim_amount.replace('$', '').replace(',', '').strip()
-                else:
-                    amount_str = str(claim_amount)
-                
-                # Convert to float if possible
-                if amount_str and amount_str != '0':
-                    amount = float(amount_str)
-                    if amount > 30000:
-                        # Check if policy mentions large amounts
-                        for keyword in amount_keywords:
-                            if keyword in content_lower:
-                                policy['critical'] = True
-                                break
-            except (ValueError, TypeError, AttributeError):
-                # Skip if conversion fails
-                pass
+            result = {k: v for k, v in policy.items() if k != 'flags'}
+            result['critical'] = bool(flags & mask)
+            highlighted.append(result)
         
-        return policies
+        return highlighted
     
     @staticmethod
     def create_pdf_url(policy):
@@ -0,0 +1,95 @@
+"""Offline policy index builder.
+
+Runs PDF extraction, embedding and (optionally) HNSW index building outside
+the web process and publishes the result as a versioned snapshot that the
+server loads at start or hot-swaps in via POST /api/reload-index.
+
+Usage (from app/backend):
+    python -m services.index_builder --docs data/documents --out data/index_snapshots
+"""
+import argparse
+import os
+import sys
+import time
+
+from services.policy_retriever import PolicyRetriever
+from services.bulk_encoder import BulkEncoder
+from services.answer_table import AnswerTable
+from services.context_parser import MyContextParser
+from services.partitions import Partitioner
+from services import index_snapshot
+
+
+def build_index(docs_folder, snapshots_root, embedding_model='all-MiniLM-L6-v2',
+                ann=True, keep=3, chunk_tokens=None, chunk_overlap=32,
+                workers=None, batch_size=512, answer_table=True):
+    """Build a snapshot from `docs_folder`; returns its path or None on failure"""
+    started = time.time()
+    retriever = PolicyRetriever(embedding_model, chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap,
+                                partitioner=Partitioner.from_config())
+    
+    # Sharded, resumable encoding; shards live in a hidden dir ignored by snapshot listing
+    encoder = BulkEncoder(embedding_model, os.path.join(snapshots_root, '.shards'),
+                          batch_size=batch_size, workers=workers, model=retriever.model)
+    if not retriever.load_documents(docs_folder, encoder=encoder):
+        print("❌ Index build failed: no documents indexed or embedding failed")
+        return None
+    if retriever.embeddings is None or len(retriever.embeddings) != len(retriever.chunks):
+        # Never publish (and prune good snapshots for) a keyword-only index
+        print("❌ Index build failed: no embeddings for the indexed chunks")
+        return None
+
+    if ann:
+        retriever.build_ann_index()
+
+    if answer_table:
+        # Precomputed answers for every dropdown combination, searched on the index just built
+        retriever.answer_table = AnswerTable.build(retriever, MyContextParser())
+
+    snapshot_dir = index_snapshot.write_snapshot(retriever, snapshots_root, extra={
+        'docs_folder': os.path.abspath(docs_folder),
+        'embedding_model': embedding_model,
+        'chunk_tokens': retriever.chunker.window_tokens,
+        'chunk_overlap': retriever.chunker.overlap_tokens,
+        'encode_stats': encoder.last_stats,
+        'has_answer_table': retriever.answer_table is not None,
+        'partitions': retriever.partition_sizes(),
+        'build_seconds': round(time.time() - started, 2)
+    })
+    removed = index_snapshot.prune_snapshots(snapshots_root, keep=keep)
+
+    print(f"✅ Published snapshot {snapshot_dir} in {time.time() - started:.1f}s")
+    if removed:
+        print(f"🗑️  Pruned old snapshots: {removed}")
+    return snapshot_dir
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Build a policy search index snapshot")
+    parser.add_argument('--docs', default=os.path.join(base_dir, 'data', 'documents'),
+                        help="Folder containing policy PDFs")
+    parser.add_argument('--out', default=os.path.join(base_dir, 'data', 'index_snapshots'),
+                        help="Snapshot root folder")
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help="SentenceTransformer model name")
+    parser.add_argument('--no-ann', action='store_true', help="Skip building the HNSW index")
+    parser.add_argument('--chunk-tokens', type=int, default=None,
+                        help="Tokens per chunk window (default: model max sequence length)")
+    parser.add_argument('--chunk-overlap', type=int, default=32, help="Tokens shared by adjacent windows")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Encoder worker processes (default: CPU count - 1)")
+    parser.add_argument('--batch-size', type=int, default=512, help="Chunks per checkpointed shard")
+    parser.add_argument('--no-answer-table', action='store_true',
+                        help="Skip precomputing answers for the front end's claim type/state/amount combinations")
+    parser.add_argument('--keep', type=int, default=3, help="Number of snapshots to keep")
+    args = parser.parse_args(argv)
+
+    snapshot_dir = build_index(args.docs, args.out, args.model, ann=not args.no_ann, keep=args.keep,
+                               chunk_tokens=args.chunk_tokens, chunk_overlap=args.chunk_overlap,
+                               workers=args.workers, batch_size=args.batch_size,
+                               answer_table=not args.no_answer_table)
+    return 0 if snapshot_dir else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import os
+import threading
+
+from services.policy_retriever import PolicyRetriever
+from services.answer_table import AnswerTable
+from services.context_parser import MyContextParser
+from services.partitions import Partitioner
+from services import index_snapshot
+
+
+class IndexManager:
+    """Owns the live PolicyRetriever and swaps in new index snapshots.
+
+    Request handlers call current() once and use that reference for the
+    whole request (read-copy-update): a reload builds a complete new
+    retriever off to the side and then replaces the reference in a single
+    assignment, so in-flight searches keep the old index until they finish
+    and never see a half-built one.
+    """
+
+    def __init__(self, snapshots_root, docs_folder, embedding_model='all-MiniLM-L6-v2'):
+        self.snapshots_root = snapshots_root
+        self.docs_folder = docs_folder
+        self.embedding_model = embedding_model
+        self._retriever = None
+        self._reload_lock = threading.Lock()
+        self.version = None
+        # model -> query encoder (e.g. batching + admission) for each embedding model an index uses
+        self.encoder_factory = None
+        self._models = {}           # embedding model name -> (loaded model, query encoder)
+        self.partitioner = Partitioner.from_config()
+
+    def current(self):
+        """The retriever to use for one request"""
+        return self._retriever
+
+    def load_initial(self):
+        """Load the newest complete snapshot, or index the PDFs in-process if there is none"""
+        snapshot_dir = index_snapshot.latest_snapshot(self.snapshots_root)
+        if snapshot_dir:
+            try:
+                retriever = self._new_retriever(self._snapshot_model(snapshot_dir))
+                self._retriever = retriever
+                return self.publish(self._load_snapshot(snapshot_dir, retriever))
+            except Exception as e:
+                print(f"⚠️ Could not load snapshot {snapshot_dir}: {e}")
+
+        retriever = self._new_retriever(self.embedding_model)
+        self._retriever = retriever
+
+        print("ℹ️  No index snapshot found, indexing PDFs in-process "
+              "(build one with: python -m services.index_builder)")
+        retriever.snapshot_version = 'in-process'
+        loaded = retriever.load_documents(self.docs_folder)
+        if loaded:
+            retriever.answer_table = AnswerTable.build(retriever, MyContextParser())
+        self.version = retriever.snapshot_version
+        return loaded
+
+    def reload(self, snapshot_version=None):
+        """Swap in a snapshot (the newest by default); returns its version"""
+        with self._reload_lock:
+            if snapshot_version:
+                snapshot_dir = os.path.join(self.snapshots_root, os.path.basename(snapshot_version))
+                if not index_snapshot.is_complete(snapshot_dir):
+                    raise ValueError(f"Snapshot not found or incomplete: {snapshot_version}")
+            else:
+                snapshot_dir = index_snapshot.latest_snapshot(self.snapshots_root)
+                if not snapshot_dir:
+                    raise ValueError("No complete index snapshot available")
+
+            retriever = self._new_retriever(self._snapshot_model(snapshot_dir))
+            self._load_snapshot(snapshot_dir, retriever)
+            self.publish(retriever)
+            print(f"🔄 Index hot-swapped to snapshot {self.version}")
+            return self.version
+
+    def update(self, change, keep=3):
+        """Apply `change(retriever)` to a copy of the live index, save it as a snapshot and publish it.
+
+        The copy is built off to the side while searches keep using the
+        current index (same read-copy-update as reload); the answer table is
+        rebuilt for the new chunks. Returns the new snapshot version.
+        """
+        with self._reload_lock:
+            successor = self._retriever.copy_for_update()
+            change(successor)
+            successor.answer_table = AnswerTable.build(successor, MyContextParser())
+            snapshot_dir = index_snapshot.write_snapshot(successor, self.snapshots_root, extra={
+                'docs_folder': successor.docs_folder,
+                'embedding_model': successor.embedding_model,
+                'based_on': self.version,
+                'has_answer_table': True,
+                'partitions': successor.partition_sizes()
+            })
+            successor.snapshot_version = index_snapshot.read_manifest(snapshot_dir)['version']
+            self.publish(successor)
+            index_snapshot.prune_snapshots(self.snapshots_root, keep=keep)
+            print(f"🔄 Index updated to snapshot {self.version}")
+            return self.version
+
+    def share_model(self, embedding_model, model, query_encoder=None):
+        """Use an already loaded model (and its query encoder) for indexes built with `embedding_model`"""
+        self._models[embedding_model] = (model, query_encoder)
+
+    def query_encoders(self):
+        """Every query encoder in use, one per embedding model"""
+        return [encoder for _, encoder in self._models.values() if encoder is not None]
+
+    def loaded_models(self):
+        """Every model kept loaded, by embedding model name (including ones no live index uses)"""
+        return {name: model for name, (model, _) in list(self._models.items()) if model is not None}
+
+    def _new_retriever(self, embedding_model):
+        """Empty retriever for `embedding_model`, with that model's shared weights and query encoder.
+        
+        Queries must be encoded by the model the index was built with, so
+        each model gets its own encoder rather than one shared by all.
+        """
+        model, query_encoder = self._models.get(embedding_model, (None, None))
+        retriever = PolicyRetriever(embedding_model, model=model, query_encoder=query_encoder,
+                                    partitioner=self.partitioner)
+        if embedding_model not in self._models and retriever.model is not None:
+            if self.encoder_factory is not None:
+                retriever.query_encoder = self.encoder_factory(retriever.model)
+            self._models[embedding_model] = (retriever.model, retriever.query_encoder)
+        return retriever
+
+    def _snapshot_model(self, snapshot_dir):
+        return index_snapshot.read_manifest(snapshot_dir).get('embedding_model') or self.embedding_model
+
+    def _load_snapshot(self, snapshot_dir, retriever):
+        retriever.load_snapshot(snapshot_dir)
+        retriever.answer_table = AnswerTable.load(snapshot_dir)
+        retriever.snapshot_version = index_snapshot.read_manifest(snapshot_dir)['version']
+        return retriever
+
+    def publish(self, retriever):
+        """Make `retriever` the live index"""
+        # Single reference assignment: readers see either the old or the new index
+        self._retriever = retriever
+        self.version = retriever.snapshot_version
+        return True
+
+    def status(self):
+        table = self._retriever.answer_table if self._retriever is not None else None
+        return {
+            'version': self.version,
+            'embedding_model': self._retriever.embedding_model if self._retriever is not None else None,
+            'embedding_models_loaded': sorted(self._models),
+            'answer_table': table.stats() if table is not None else None,
+            'partitions': self._retriever.partition_sizes() if self._retriever is not None else {},
+            'snapshots_root': self.snapshots_root,
+            'available_snapshots': index_snapshot.list_snapshots(self.snapshots_root)
+        }
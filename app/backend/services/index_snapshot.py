@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+MANIFEST = 'manifest.json'
+BUILDING_PREFIX = '.building-'
+
+
+def new_version():
+    """Sortable snapshot version string"""
+    return datetime.now().strftime('%Y%m%dT%H%M%S%f')
+
+
+def is_complete(snapshot_dir):
+    """A snapshot counts only once its manifest says it is complete"""
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST), 'r') as f:
+            return bool(json.load(f).get('complete'))
+    except (OSError, ValueError):
+        return False
+
+
+def list_snapshots(snapshots_root):
+    """Complete snapshot versions under `snapshots_root`, newest first"""
+    if not os.path.isdir(snapshots_root):
+        return []
+    versions = [
+        d for d in os.listdir(snapshots_root)
+        if not d.startswith('.') and is_complete(os.path.join(snapshots_root, d))
+    ]
+    return sorted(versions, reverse=True)
+
+
+def latest_snapshot(snapshots_root):
+    """Path of the newest complete snapshot, or None"""
+    versions = list_snapshots(snapshots_root)
+    return os.path.join(snapshots_root, versions[0]) if versions else None
+
+
+def read_manifest(snapshot_dir):
+    with open(os.path.join(snapshot_dir, MANIFEST), 'r') as f:
+        return json.load(f)
+
+
+def write_snapshot(retriever, snapshots_root, extra=None):
+    """Persist `retriever` as a new versioned snapshot.
+
+    Everything is written into a hidden staging directory, the manifest
+    last, and the directory is then renamed into place, so readers never
+    see a half-written snapshot.
+    """
+    os.makedirs(snapshots_root, exist_ok=True)
+    version = new_version()
+    staging_dir = os.path.join(snapshots_root, BUILDING_PREFIX + version)
+    final_dir = os.path.join(snapshots_root, version)
+
+    try:
+        retriever.save_snapshot(staging_dir)
+        manifest = {
+            'version': version,
+            'created': datetime.now().isoformat(),
+            'complete': True,
+            'chunk_count': retriever.get_total_chunks(),
+            'pdf_count': retriever.get_document_count(),
+            'has_embeddings': retriever.embeddings is not None,
+            'has_ann_index': retriever.ann_index is not None
+        }
+        manifest.update(extra or {})
+        with open(os.path.join(staging_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(staging_dir, final_dir)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    return final_dir
+
+
+def prune_snapshots(snapshots_root, keep=3, stale_after=3600):
+    """Delete all but the newest `keep` complete snapshots plus abandoned staging dirs"""
+    removed = []
+    for version in list_snapshots(snapshots_root)[keep:]:
+        shutil.rmtree(os.path.join(snapshots_root, version), ignore_errors=True)
+        removed.append(version)
+    if os.path.isdir(snapshots_root):
+        for d in os.listdir(snapshots_root):
+            path = os.path.join(snapshots_root, d)
+            if d.startswith(BUILDING_PREFIX) and time.time() - os.path.getmtime(path) > stale_after:
+                shutil.rmtree(path, ignore_errors=True)
+    return removed
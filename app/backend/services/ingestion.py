@@ -0,0 +1,152 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from services.metrics import metrics
+
+
+class IngestionJob:
+    """One uploaded PDF on its way into the index"""
+
+    def __init__(self, filename, pdf_path):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.filename = filename
+        self.pdf_path = pdf_path
+        self.status = 'queued'      # queued -> running -> done | failed
+        self.stage = None           # extracting, embedding, publishing while running
+        self.chunks_added = 0
+        self.index_version = None
+        self.error = None
+        self.created = datetime.now().isoformat()
+        self.started = None
+        self.finished = None
+        self.seconds = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'filename': self.filename,
+            'status': self.status,
+            'stage': self.stage,
+            'chunks_added': self.chunks_added,
+            'index_version': self.index_version,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'seconds': self.seconds
+        }
+
+
+class IngestionQueue:
+    """Background worker that adds uploaded PDFs to the live index.
+
+    The upload handler stores the file and queues a job. One worker thread
+    runs the jobs in order: extraction, embedding and the append happen on
+    a copy of the index (IndexManager.update), which is then saved as a new
+    snapshot and published, so searches never wait on ingestion and see the
+    document as soon as its job is done. Finished jobs are kept for status
+    queries, the most recent `keep_jobs` of them.
+    """
+
+    def __init__(self, index_manager, keep_jobs=200):
+        self.index_manager = index_manager
+        self.keep_jobs = keep_jobs
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, filename, pdf_path):
+        """Queue a stored PDF for indexing; returns its job"""
+        job = IngestionJob(filename, pdf_path)
+        with self._jobs_lock:
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.keep_jobs:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.status not in ('done', 'failed'):
+                    break
+                self._jobs.popitem(last=False)
+        self._ensure_started()
+        self._queue.put(job)
+        metrics.inc('ingestion_jobs_total', status='queued')
+        return job
+
+    def get(self, job_id):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """All kept jobs, newest first"""
+        with self._jobs_lock:
+            return list(reversed(self._jobs.values()))
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def reset_after_fork(self):
+        """Give a forked child its own queue; the worker thread restarts on the next upload"""
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._jobs_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='ingestion', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._process(self._queue.get())
+
+    def _process(self, job):
+        started = time.perf_counter()
+        job.status = 'running'
+        job.started = datetime.now().isoformat()
+
+        def set_stage(stage):
+            job.stage = stage
+
+        def append(retriever):
+            job.chunks_added = retriever.add_document(job.pdf_path, progress=set_stage)
+            set_stage('publishing')
+
+        try:
+            job.index_version = self.index_manager.update(append)
+            job.status = 'done'
+            print(f"📥 Ingested {job.filename}: {job.chunks_added} chunks, index {job.index_version}")
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            print(f"❌ Ingestion of {job.filename} failed: {e}")
+            self._discard_upload(job)
+        finally:
+            job.stage = None
+            job.finished = datetime.now().isoformat()
+            job.seconds = round(time.perf_counter() - started, 2)
+            metrics.inc('ingestion_jobs_total', status=job.status)
+            metrics.observe('stage_latency_seconds', time.perf_counter() - started, stage='ingestion')
+
+    def _discard_upload(self, job):
+        """Remove a failed job's PDF so it can be uploaded again and a full rebuild doesn't index it"""
+        current = self.index_manager.current()
+        if current is not None and job.filename in current.get_document_list():
+            return  # Failed after the new index went live (e.g. pruning); the document is indexed
+        try:
+            os.remove(job.pdf_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ Could not remove {job.pdf_path}: {e}")
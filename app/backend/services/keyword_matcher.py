@@ -0,0 +1,63 @@
+from collections import deque
+
+
+class KeywordMatcher:
+    """Aho–Corasick automaton mapping many keywords to bit flags in one pass.
+
+    Each keyword carries a flag; scanning a text ORs together the flags of
+    every keyword that occurs in it (case-insensitive substring match, the
+    same semantics as `keyword in text.lower()`), stopping early once every
+    flag is set.
+    """
+
+    def __init__(self, keyword_flags):
+        self._goto = [{}]       # state -> {char: next state}
+        self._fail = [0]
+        self._output = [0]      # state -> OR of flags of keywords ending here
+        self.all_flags = 0
+
+        for keyword, flag in keyword_flags.items():
+            self._add(keyword.lower(), flag)
+            self.all_flags |= flag
+        self._build_failure_links()
+
+    def _add(self, keyword, flag):
+        state = 0
+        for char in keyword:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(0)
+            state = nxt
+        self._output[state] |= flag
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._output[nxt] |= self._output[self._fail[nxt]]
+
+    def match_flags(self, text):
+        """OR of the flags of all keywords found in `text`"""
+        goto, fail, output = self._goto, self._fail, self._output
+        flags = 0
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                flags |= output[state]
+                if flags == self.all_flags:
+                    break
+        return flags
@@ -0,0 +1,93 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from services.metrics import metrics, inline_work_requested
+
+
+class LegResult:
+    """Outcome of one leg: status is 'ok', 'timeout' or 'error'; inline if it ran on the caller's thread"""
+
+    def __init__(self, name, status, value=None, error=None, elapsed_ms=None, inline=False):
+        self.name = name
+        self.status = status
+        self.value = value
+        self.error = error
+        self.elapsed_ms = elapsed_ms
+        self.inline = inline
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+    def summary(self):
+        info = {'status': self.status, 'elapsed_ms': self.elapsed_ms}
+        if self.error is not None:
+            info['error'] = str(self.error)
+        return info
+
+
+class LegExecutor:
+    """Shared, bounded thread pool for running independent parts of a request concurrently.
+
+    run() submits every leg, then waits for each one up to its own
+    timeout. A leg that is too slow or fails is reported with that status
+    and no value, so the caller can answer with the legs that did finish.
+    Each leg runs in a copy of the caller's contextvars context, so
+    per-request metrics keep working.
+
+    At most `max_workers + max_queue` legs are in the pool process-wide; a
+    timed-out leg keeps its slot until it actually finishes. A leg that
+    finds no free slot runs on the calling thread instead (no timeout,
+    no concurrency), so busy periods make requests slower, not emptier.
+    """
+
+    def __init__(self, max_workers=8, max_queue=None):
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_workers + (max_queue if max_queue is not None else max_workers))
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='leg')
+
+    def run(self, legs, timeouts, default_timeout=5.0):
+        """Run {name: callable} concurrently; returns {name: LegResult}"""
+        started = time.perf_counter()
+        futures = {}
+        results = {}
+        inline = {}
+        for name, fn in legs.items():
+            if inline_work_requested() or not self._slots.acquire(blocking=False):
+                inline[name] = fn
+                continue
+            context = contextvars.copy_context()
+            future = self._pool.submit(context.run, self._timed, fn)
+            future.add_done_callback(lambda _: self._slots.release())
+            futures[name] = future
+
+        # Pool full (or the request is profiled): run the rest here, while submitted legs proceed in the pool
+        for name, fn in inline.items():
+            try:
+                value, elapsed_ms = self._timed(fn)
+                results[name] = LegResult(name, 'ok', value, elapsed_ms=elapsed_ms, inline=True)
+            except Exception as e:
+                results[name] = LegResult(name, 'error', error=e, inline=True)
+            metrics.inc('leg_outcomes_total', leg=name, status='inline' if results[name].ok else 'error')
+
+        for name, future in futures.items():
+            # Every leg's budget counts from when the legs were started
+            remaining = timeouts.get(name, default_timeout) - (time.perf_counter() - started)
+            try:
+                value, elapsed_ms = future.result(timeout=max(0.0, remaining))
+                results[name] = LegResult(name, 'ok', value, elapsed_ms=elapsed_ms)
+            except FutureTimeout:
+                results[name] = LegResult(name, 'timeout',
+                                          elapsed_ms=round((time.perf_counter() - started) * 1000, 3))
+            except Exception as e:
+                results[name] = LegResult(name, 'error', error=e)
+            metrics.inc('leg_outcomes_total', leg=name, status=results[name].status)
+        return results
+
+    @staticmethod
+    def _timed(fn):
+        started = time.perf_counter()
+        value = fn()
+        return value, round((time.perf_counter() - started) * 1000, 3)
@@ -0,0 +1,154 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+TEXT_FORMAT = '%(asctime)s %(levelname)-7s %(name)s [%(threadName)s] %(message)s'
+
+# LogRecord attributes; anything else on a record came from `extra=` and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# Set by configure_logging()
+_listener = None
+_queue_handler = None
+
+
+class DebugSampler(logging.Filter):
+    """Rate-limit DEBUG records per call site.
+
+    The first `burst` records from a given logger line in each `interval`
+    seconds pass; after that only one in `sample_every` does. Records above
+    DEBUG always pass.
+    """
+
+    def __init__(self, burst=20, interval=1.0, sample_every=100):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sample_every = max(1, sample_every)
+        self._lock = threading.Lock()
+        self._windows = {}      # (logger, lineno) -> [window start, count]
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        key = (record.name, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                window = self._windows[key] = [now, 0]
+            window[1] += 1
+            count = window[1]
+        return count <= self.burst or (count - self.burst) % self.sample_every == 0
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Text lines with `extra=` fields appended as key=value pairs"""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{k}={v!r}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including `extra=` fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def _extra_fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and not k.startswith('_')}
+
+
+def parse_module_levels(spec):
+    """'services.policy_retriever=DEBUG,werkzeug=WARNING' -> {name: level}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level=None, module_levels=None, json_format=None, stream=None,
+                      debug_burst=20, debug_interval=1.0, debug_sample_every=100):
+    """Route all logging through a queue drained by one background writer thread.
+
+    Request threads only enqueue records, so they never block on terminal or
+    file I/O. Defaults come from LOG_LEVEL, LOG_LEVELS (per-module overrides)
+    and LOG_FORMAT=json. Calling again while configured is a no-op.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    if module_levels is None:
+        module_levels = parse_module_levels(os.environ.get('LOG_LEVELS'))
+    if json_format is None:
+        json_format = os.environ.get('LOG_FORMAT', '').lower() == 'json'
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if json_format else KeyValueFormatter(TEXT_FORMAT))
+
+    # Sampling runs before enqueueing so dropped debug records cost no queue traffic
+    _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(DebugSampler(debug_burst, debug_interval, debug_sample_every))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def restart_after_fork():
+    """Start a fresh queue and writer thread in a forked child.
+
+    Threads don't survive fork(), so without this a child's records would
+    pile up in a queue nobody drains.
+    """
+    global _listener
+    if _listener is None or _queue_handler is None:
+        return
+    handlers = _listener.handlers
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
@@ -0,0 +1,156 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def deep_sizeof(obj, _seen=None):
+    """Approximate bytes held by a tree of dicts/lists/strings (JSON-like data)"""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def process_rss_bytes():
+    """Current resident set size, or None if the platform doesn't expose it"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports KiB
+
+
+def model_parameter_bytes(model):
+    """Bytes of parameters and buffers of a torch-backed model, or None"""
+    if model is None or not hasattr(model, 'parameters'):
+        return None
+    try:
+        total = sum(p.numel() * p.element_size() for p in model.parameters())
+        total += sum(b.numel() * b.element_size() for b in model.buffers())
+        return int(total)
+    except Exception:
+        return None
+
+
+class MemoryMonitor:
+    """Memory breakdown of the running process plus a bounded growth history.
+
+    Samples are taken on demand (GET /api/memory) and at most every
+    `sample_interval` seconds via maybe_sample(), which the app calls after
+    requests - no background thread. Growth is reported between the oldest
+    and newest retained samples, so a steadily climbing RSS or precedent
+    encode count shows up as a per-hour rate.
+    """
+
+    def __init__(self, index_manager, precedent_retriever, sample_interval=300, history=288):
+        self.index_manager = index_manager
+        self.precedent_retriever = precedent_retriever
+        self.sample_interval = sample_interval
+        self.samples = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._last_sample = 0.0
+
+    def breakdown(self):
+        """Current memory usage by component"""
+        retriever = self.index_manager.current()
+        index = retriever.memory_usage()
+        precedents = self.precedent_retriever.memory_usage()
+
+        # Retrievers may share one SentenceTransformer; count each instance once
+        models = {}
+        owned = [('policy_retriever', retriever.model),
+                 ('precedent_retriever', getattr(self.precedent_retriever, 'model', None))]
+        # Models kept for other snapshots' embedding models still hold memory after a hot-swap
+        owned += [(f'index_manager:{name}', model) for name, model in self.index_manager.loaded_models().items()]
+        for owner, model in owned:
+            if model is None:
+                continue
+            entry = models.setdefault(id(model), {'owners': [], 'parameter_bytes': model_parameter_bytes(model)})
+            entry['owners'].append(owner)
+
+        return {
+            'rss_bytes': process_rss_bytes(),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'index_version': self.index_manager.version,
+            'policy_index': index,
+            'precedents': precedents,
+            'models': list(models.values()),
+            'accounted_bytes': (
+                (0 if index['embeddings_mmapped'] else index['embeddings_bytes'])
+                + index['chunk_text_bytes'] + index['metadata_bytes'] + index['ann_index_bytes']
+                + precedents['records_bytes'] + precedents['embeddings_bytes']
+                + sum(m['parameter_bytes'] or 0 for m in models.values())
+            )
+        }
+
+    def sample(self):
+        """Record a history point and return the full breakdown"""
+        current = self.breakdown()
+        point = {
+            'time': datetime.now().isoformat(),
+            'monotonic': time.monotonic(),
+            'rss_bytes': current['rss_bytes'],
+            'accounted_bytes': current['accounted_bytes'],
+            'embeddings_bytes': current['policy_index']['embeddings_bytes'],
+            'precedent_count': current['precedents']['precedent_count'],
+            'precedent_encodes': current['precedents']['encode_count']
+        }
+        with self._lock:
+            self.samples.append(point)
+            self._last_sample = point['monotonic']
+        return current
+
+    def maybe_sample(self):
+        """Take a sample if the last one is older than sample_interval"""
+        if time.monotonic() - self._last_sample < self.sample_interval:
+            return
+        try:
+            self.sample()
+        except Exception:
+            pass  # Accounting must never fail a request
+
+    def growth(self):
+        """Change between the oldest and newest samples, absolute and per hour"""
+        with self._lock:
+            if len(self.samples) < 2:
+                return None
+            first, last = self.samples[0], self.samples[-1]
+        hours = (last['monotonic'] - first['monotonic']) / 3600
+        deltas = {}
+        for key in ('rss_bytes', 'accounted_bytes', 'embeddings_bytes', 'precedent_count', 'precedent_encodes'):
+            if first[key] is None or last[key] is None:
+                continue
+            delta = last[key] - first[key]
+            # Rates over less than a minute are noise
+            deltas[key] = {'delta': delta, 'per_hour': round(delta / hours, 1) if hours >= 1 / 60 else None}
+        return {'since': first['time'], 'until': last['time'], 'samples': len(self.samples), 'changes': deltas}
+
+    def history(self):
+        with self._lock:
+            return [{k: v for k, v in point.items() if k != 'monotonic'} for point in self.samples]
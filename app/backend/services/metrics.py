@@ -0,0 +1,175 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds (Prometheus `le` bounds)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Per-request stage breakdown, set while a request is being timed
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+# Set while a request is profiled: helpers run its work on the request's own thread
+_inline_work = contextvars.ContextVar('inline_work', default=False)
+
+
+class MetricsRegistry:
+    """In-process counters and latency histograms rendered in Prometheus text format"""
+
+    def __init__(self, namespace='appian_assistant', buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}      # (name, labels) -> value
+        self._gauges = {}        # (name, labels) -> current value
+        self._histograms = {}    # (name, labels) -> [bucket counts..., sum, count]
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            if slot < len(self.buckets):
+                hist[slot] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+
+    @contextmanager
+    def span(self, stage):
+        """Time a block as `stage` in the histogram and in the current request's breakdown"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe('stage_latency_seconds', elapsed, stage=stage)
+            timings = _request_timings.get()
+            if timings is not None:
+                timings[stage] = round(timings.get(stage, 0.0) + elapsed * 1000, 3)
+
+    def render_prometheus(self):
+        """Exposition text for GET /api/metrics"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        lines = []
+        for name in sorted({n for n, _ in counters}):
+            full = f"{self.namespace}_{name}"
+            lines.append(f"# HELP {full} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {full} counter")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{full}{_format_labels(labels)} {value}")
+
+        for name in sorted({n for n, _ in gauges}):
+            full = f"{self.namespace}_{name}"
+            lines.append(f"# HELP {full} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {full} gauge")
+            for (n, labels), value in sorted(gauges.items()):
+                if n == name:
+                    lines.append(f"{full}{_format_labels(labels)} {value}")
+
+        for name in sorted({n for n, _ in histograms}):
+            full = f"{self.namespace}_{name}"
+            lines.append(f"# HELP {full} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {full} histogram")
+            for (n, labels), hist in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, hist):
+                    cumulative += count
+                    lines.append(f"{full}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{full}_bucket{_format_labels(labels + (('le', '+Inf'),))} {hist[-1]}")
+                lines.append(f"{full}_sum{_format_labels(labels)} {hist[-2]:.6f}")
+                lines.append(f"{full}_count{_format_labels(labels)} {hist[-1]}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def begin_request_timings():
+    """Start collecting a {stage: milliseconds} breakdown; returns a token for end_request_timings()"""
+    return _request_timings.set({})
+
+
+def end_request_timings(token):
+    _request_timings.reset(token)
+
+
+def current_timings():
+    """The breakdown being collected for the current request, or None"""
+    return _request_timings.get()
+
+
+def inline_work_requested():
+    """True if the current request wants legs and query encodes run on its own thread"""
+    return _inline_work.get()
+
+
+@contextmanager
+def inline_work():
+    """Keep the enclosed block's legs and query encodes on the calling thread (e.g. for cProfile)"""
+    token = _inline_work.set(True)
+    try:
+        yield
+    finally:
+        _inline_work.reset(token)
+
+
+@contextmanager
+def request_timings():
+    """Collect a {stage: milliseconds} breakdown for the enclosed block"""
+    token = begin_request_timings()
+    try:
+        yield current_timings()
+    finally:
+        end_request_timings(token)
+
+
+# Process-wide registry shared by the app and the services
+metrics = MetricsRegistry()
+metrics.describe('stage_latency_seconds', 'Latency of analysis stages, model encodes and index searches')
+metrics.describe('http_request_duration_seconds', 'End-to-end API request latency')
+metrics.describe('http_requests_total', 'API requests by endpoint and status code')
+metrics.describe('search_fallbacks_total', 'Policy searches served by a fallback engine')
+metrics.describe('leg_outcomes_total', 'Concurrent request legs by outcome (ok, inline = ran on the request thread because the pool was full, timeout, error)')
+metrics.describe('query_encode_batches_total', 'Batched query encoder forward passes')
+metrics.describe('query_encode_texts_total', 'Query texts encoded by the batching encoder')
+metrics.describe('singleflight_shared_total', 'Requests answered by joining an identical in-flight computation')
+metrics.describe('admission_in_flight', 'Model inference calls currently admitted')
+metrics.describe('admission_queue_depth', 'Model inference calls waiting for a slot')
+metrics.describe('admission_wait_seconds', 'Time spent waiting for a model inference slot')
+metrics.describe('admission_rejected_total', 'Model inference calls turned away because the wait queue was full or the wait too long')
+metrics.describe('search_cache_hits_total', 'Policy searches answered from the per-index result cache')
+metrics.describe('answer_table_lookups_total', 'analyze-case policy searches looked up in the precomputed answer table')
+metrics.describe('ingestion_jobs_total', 'Uploaded policy PDFs by ingestion outcome')
+metrics.describe('partition_routes_total', 'analyze-case policy searches by the partitions their claim type routed to (all = scatter-gather)')
@@ -0,0 +1,71 @@
+import json
+import os
+import re
+
+DEFAULT_PARTITION = 'general'
+
+# partition -> filename pattern (case-insensitive); first match wins, anything else is 'general'
+DEFAULT_FILE_RULES = {
+    'health': r'health|medical',
+    'ev': r'(^|[^a-z])(ev|electric)([^a-z]|$)'
+}
+
+# claim-type pattern -> partitions a case of that type searches
+DEFAULT_ROUTES = {
+    r'health|medical': ['health'],
+    r'(^|[^a-z])(ev|electric)([^a-z]|$)': ['ev'],
+    r'car|auto|vehicle|flood|fire|home|property': ['general']
+}
+
+
+class Partitioner:
+    """Assigns policy documents to product-line partitions and routes claim types to them.
+
+    Defaults: health (`indi_health`, `medical_INS`), ev (`EV_policy`) and
+    general for everything else. A JSON config (PARTITIONS_CONFIG) can
+    replace the filename rules, pin individual files and change the routes:
+
+        {"file_rules": {"health": "health|medical"},
+         "files": {"special_rider.pdf": "health"},
+         "routes": {"health": ["health", "general"]}}
+
+    A claim type no route matches (or no claim type at all) searches every
+    partition and merges the results.
+    """
+
+    def __init__(self, file_rules=None, files=None, routes=None):
+        rules = DEFAULT_FILE_RULES if file_rules is None else file_rules
+        self.file_rules = [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in rules.items()]
+        self.files = {name.lower(): partition for name, partition in (files or {}).items()}
+        self.routes = [(re.compile(pattern, re.IGNORECASE), list(partitions))
+                       for pattern, partitions in (DEFAULT_ROUTES if routes is None else routes).items()]
+
+    @classmethod
+    def from_config(cls, path=None):
+        """Partitioner from PARTITIONS_CONFIG (or `path`); None when PARTITIONING=off"""
+        if os.environ.get('PARTITIONING', 'on').lower() in ('0', 'off', 'false', 'no'):
+            return None
+        path = path or os.environ.get('PARTITIONS_CONFIG')
+        if not path:
+            return cls()
+        with open(path, 'r') as f:
+            config = json.load(f)
+        return cls(config.get('file_rules'), config.get('files'), config.get('routes'))
+
+    def partition_of(self, filename):
+        pinned = self.files.get(os.path.basename(filename).lower())
+        if pinned:
+            return pinned
+        for name, pattern in self.file_rules:
+            if pattern.search(filename):
+                return name
+        return DEFAULT_PARTITION
+
+    def route(self, claim_type):
+        """Partitions for a claim type, or None for all of them"""
+        if not claim_type or not isinstance(claim_type, str):
+            return None
+        for pattern, partitions in self.routes:
+            if pattern.search(claim_type):
+                return partitions
+        return None
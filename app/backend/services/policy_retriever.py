@@ -1,31 +1,78 @@
 import os
 import json
+import logging
 import PyPDF2
 import hashlib
+import threading
+import time
+from collections import OrderedDict
 import numpy as np
 from sentence_transformers import SentenceTransformer
+from services.chunk_store import ChunkStore
+from services.citation_builder import CitationBuilder
+from services.chunker import SlidingWindowChunker
+from services.metrics import metrics
+from services.admission import Overloaded
+
+log = logging.getLogger(__name__)
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
 
 class PolicyRetriever:
-    def __init__(self, embedding_model='all-MiniLM-L6-v2'):
+    SKIP_DECAY = 0.9    # share of an engine's latency estimate kept each time a budgeted search skips it
+    
+    def __init__(self, embedding_model='all-MiniLM-L6-v2', model=None,
+                 chunk_tokens=None, chunk_overlap=32, query_encoder=None, result_cache_size=512,
+                 partitioner=None):
         print("🔄 Initializing PDF Policy Retriever...")
-        try:
-            self.model = SentenceTransformer(embedding_model)
-            print("✅ SentenceTransformer loaded")
-        except ImportError as e:
-            print(f"⚠️ SentenceTransformers not installed: {e}")
-            self.model = None
-        except Exception as e:
-            print(f"⚠️ Error loading model: {e}")
-            self.model = None
+        self.embedding_model = embedding_model
+        if model is not None:
+            # Share an already loaded model (e.g. when swapping in a new index snapshot)
+            self.model = model
+        else:
+            try:
+                self.model = SentenceTransformer(embedding_model)
+                print("✅ SentenceTransformer loaded")
+            except ImportError as e:
+                print(f"⚠️ SentenceTransformers not installed: {e}")
+                self.model = None
+            except Exception as e:
+                print(f"⚠️ Error loading model: {e}")
+                self.model = None
         
-        self.documents = []      # List of text chunks
-        self.metadata = []       # Metadata for each chunk
+        # Token-bounded windows sized to the model's max sequence length
+        self.chunker = SlidingWindowChunker.for_model(self.model, chunk_tokens, chunk_overlap)
+        self.chunks = ChunkStore()  # Columnar chunk text + metadata
+        self.docs_folder = None
         self.pdf_files = []      # List of PDF files
         self.embeddings = None   # Document embeddings
+        self.ann_index = None    # Optional FAISS HNSW index over the embeddings
+        self.snapshot_version = None
+        self.answer_table = None  # Precomputed answers for dropdown-only cases (services/answer_table.py)
+        self.query_encoder = query_encoder  # e.g. a shared BatchingEncoder; None = encode with self.model
+        # Results of recent searches on this index (a hot-swap starts with an empty one)
+        self.result_cache_size = result_cache_size
+        self._result_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Moving average of each engine's latency, used to pick one that fits a budget
+        self.engine_latency_ms = {'semantic': 0.0, 'keyword': 0.0}
+        self._latency_lock = threading.Lock()
+        # Product-line sub-indexes (services/partitions.py); None = one flat index
+        self.partitioner = partitioner
+        self._partitions = None          # (chunk count, embeddings id, {partition: chunk rows})
+        self._partition_vectors = {}     # partition -> contiguous copy of its embedding rows
+        self._partition_lock = threading.Lock()
         print("✅ PDF Retriever initialized")
     
-    def load_documents(self, docs_folder):
-        """Load and index PDF documents from specified folder"""
+    def load_documents(self, docs_folder, encoder=None):
+        """Load and index PDF documents from specified folder.
+        
+        `encoder` (e.g. a BulkEncoder) replaces the single in-process
+        model.encode call for large corpora.
+        """
         try:
             if not docs_folder:
                 print("❌ No documents folder specified")
@@ -52,52 +99,59 @@ class PolicyRetriever:
             
             print(f"📚 Found {len(pdf_files)} PDF files: {pdf_files}")
             
-            all_chunks = []
-            all_metadata = []
+            chunks = ChunkStore()
+            seen_files = {}     # file sha256 -> [(chunk index, page)] of the first copy
+            seen_chunks = {}    # chunk digest -> chunk index
             
-            for pdf_file in pdf_files:
+            # Shortest name first so "EV_policy.pdf" wins over "EV_policy (1).pdf"
+            for pdf_file in sorted(pdf_files, key=lambda f: (len(f), f)):
                 pdf_path = os.path.join(docs_folder, pdf_file)
                 print(f"📄 Processing: {pdf_file}")
                 
                 try:
-                    # Extract text from PDF
-                    text_chunks = self._extract_text_from_pdf(pdf_path)
+                    # Byte-identical copies reuse the first copy's chunks
+                    file_digest = self._file_digest(pdf_path)
+                    if file_digest in seen_files:
+                        source_id = chunks.add_source(pdf_file, pdf_path)
+                        for idx, page_num in seen_files[file_digest]:
+                            chunks.add_location(idx, source_id, page_num)
+                        self.pdf_files.append(pdf_file)
+                        print(f"  ♻️ Identical content already indexed, added as extra citation source")
+                        continue
+                    
+                    source_id = chunks.add_source(pdf_file, pdf_path)
+                    file_refs = self._chunk_pdf(chunks, pdf_path, source_id, seen_chunks)
                     
-                    if not text_chunks:
+                    if not file_refs:
                         print(f"  ⚠️ No text extracted from {pdf_file} (might be scanned image)")
                         continue
                     
-                    for page_num, chunk in enumerate(text_chunks, 1):
-                        if chunk and len(chunk.strip()) > 30:  # Skip empty/short chunks
-                            all_chunks.append(chunk)
-                            all_metadata.append({
-                                'source': pdf_file,
-                                'page': page_num,
-                                'pdf_path': pdf_path,
-                                'chunk_hash': hashlib.md5(chunk.encode()).hexdigest()[:8],
-                                'chunk_length': len(chunk)
-                            })
-                    
+                    seen_files[file_digest] = file_refs
                     self.pdf_files.append(pdf_file)
-                    print(f"  ✅ Extracted {len(text_chunks)} text chunks")
+                    print(f"  ✅ Extracted {len(file_refs)} text chunks")
                     
                 except Exception as e:
                     print(f"  ❌ Error processing {pdf_file}: {e}")
                     continue
             
-            if not all_chunks:
+            if not len(chunks):
                 print("❌ No text extracted from any PDFs")
                 print("ℹ️  PDFs might be scanned images or protected")
                 return False
             
-            self.documents = all_chunks
-            self.metadata = all_metadata
+            self.chunks = chunks
+            self.docs_folder = docs_folder
             
             # Create embeddings for semantic search
-            print(f"🔧 Creating embeddings for {len(self.documents)} chunks...")
-            if self.model:
+            print(f"🔧 Creating embeddings for {len(self.chunks)} chunks...")
+            if encoder is not None:
+                # No keyword-only fallback here: an offline build must fail rather than publish a
+                # snapshot without embeddings (finished shards stay on disk for the next run)
+                self.embeddings = encoder.encode(self.chunks.iter_texts())
+                print(f"✅ Embeddings created: {self.embeddings.shape}")
+            elif self.model:
                 try:
-                    self.embeddings = self.model.encode(self.documents, show_progress_bar=False)
+                    self.embeddings = self.model.encode(list(self.chunks.iter_texts()), show_progress_bar=False)
                     print(f"✅ Embeddings created: {self.embeddings.shape}")
                 except Exception as e:
                     print(f"⚠️ Error creating embeddings: {e}")
@@ -107,7 +161,7 @@ class PolicyRetriever:
                 print("⚠️ No model available, using simple text search")
                 self.embeddings = None
             
-            print(f"✅ Successfully loaded {len(self.pdf_files)} PDFs with {len(self.documents)} text chunks")
+            print(f"✅ Successfully loaded {len(self.pdf_files)} PDFs with {len(self.chunks)} unique text chunks")
             return True
             
         except Exception as e:
@@ -116,142 +170,381 @@ class PolicyRetriever:
             traceback.print_exc()
             return False
     
+    def _chunk_pdf(self, chunks, pdf_path, source_id, seen_chunks):
+        """Append one PDF's chunks to `chunks`; returns [(chunk index, page)] of the chunks kept"""
+        file_refs = []
+        # Stream pages through the chunker - one page in memory at a time
+        for piece in self.chunker.chunk_pages(self._iter_pdf_pages(pdf_path)):
+            chunk, page_num = piece['text'], piece['page']
+            if chunk and len(chunk.strip()) > 30:  # Skip empty/short chunks
+                chunk_digest = hashlib.md5(chunk.encode()).digest()
+                
+                if chunk_digest in seen_chunks:
+                    # Same text on another page/file: one embedding, extra location
+                    idx = seen_chunks[chunk_digest]
+                    chunks.add_location(idx, source_id, page_num)
+                else:
+                    # Criticality depends only on the text, so tag it once here
+                    flags = CitationBuilder.compute_flags(chunk)
+                    idx = chunks.append(chunk, source_id, page_num, chunk_digest, flags,
+                                        piece['char_start'], piece['char_end'])
+                    seen_chunks[chunk_digest] = idx
+                file_refs.append((idx, page_num))
+        return file_refs
+    
+    def copy_for_update(self):
+        """A new retriever with its own copy of this index, to change off to the side and then publish"""
+        successor = PolicyRetriever(self.embedding_model, model=self.model,
+                                    chunk_tokens=self.chunker.window_tokens,
+                                    chunk_overlap=self.chunker.overlap_tokens,
+                                    query_encoder=self.query_encoder,
+                                    result_cache_size=self.result_cache_size,
+                                    partitioner=self.partitioner)
+        successor.chunks = self.chunks.copy()
+        if self.embeddings is not None:
+            successor.embeddings = np.array(self.embeddings, dtype=np.float32)
+        if self.ann_index is not None:
+            successor.ann_index = faiss.clone_index(self.ann_index)
+        successor.docs_folder = self.docs_folder
+        successor.pdf_files = list(self.pdf_files)
+        successor.snapshot_version = self.snapshot_version
+        return successor
+    
+    def add_document(self, pdf_path, progress=None):
+        """Index one more PDF into this retriever (an unpublished copy); returns the number of new chunks"""
+        progress = progress or (lambda stage: None)
+        pdf_file = os.path.basename(pdf_path)
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF not found: {pdf_path}")
+        first_new = len(self.chunks)
+        
+        progress('extracting')
+        source_id = self.chunks.add_source(pdf_file, pdf_path)
+        if not self._chunk_pdf(self.chunks, pdf_path, source_id, self.chunks.digest_index()):
+            raise ValueError(f"No text extracted from {pdf_file} (might be scanned image)")
+        
+        new_texts = [self.chunks.text_at(idx) for idx in range(first_new, len(self.chunks))]
+        if new_texts and self.model and (self.embeddings is not None or first_new == 0):
+            progress('embedding')
+            vectors = np.asarray(self.model.encode(new_texts, show_progress_bar=False), dtype=np.float32)
+            if self.embeddings is None:
+                self.embeddings = vectors
+            else:
+                self.embeddings = np.vstack([self.embeddings, vectors])
+            if self.ann_index is not None:
+                self.ann_index.add(vectors)
+        
+        self.pdf_files.append(pdf_file)
+        print(f"✅ Added {pdf_file}: {len(new_texts)} new chunks ({len(self.chunks)} total)")
+        return len(new_texts)
+    
+    @staticmethod
+    def _file_digest(pdf_path):
+        """sha256 of the raw PDF bytes, used to skip byte-identical copies"""
+        digest = hashlib.sha256()
+        with open(pdf_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
     def _extract_text_from_pdf(self, pdf_path):
         """Extract text from PDF with page preservation"""
-        text_chunks = []
+        return [text for _, text in self._iter_pdf_pages(pdf_path)]
+    
+    def _iter_pdf_pages(self, pdf_path):
+        """Yield (page_number, cleaned_text) one page at a time"""
         try:
             with open(pdf_path, 'rb') as file:
                 # Use PdfReader instead of PdfFileReader for PyPDF2 v3.0+
                 try:
                     pdf_reader = PyPDF2.PdfReader(file)
-                    
-                    for page_num in range(len(pdf_reader.pages)):
-                        page = pdf_reader.pages[page_num]
-                        text = page.extract_text()
-                        
-                        if text and text.strip():
-                            # Clean text: remove excessive whitespace
-                            clean_text = ' '.join(text.replace('\n', ' ').split())
-                            if len(clean_text) > 50:  # Only include meaningful content
-                                text_chunks.append(clean_text)
-                            elif len(clean_text) > 10:
-                                # Keep short chunks that might be important
-                                text_chunks.append(clean_text)
-                    
-                    return text_chunks
-                    
+                    pages = ((n, pdf_reader.pages[n].extract_text) for n in range(len(pdf_reader.pages)))
                 except AttributeError:
                     # Fallback for older PyPDF2 versions
                     pdf_reader = PyPDF2.PdfFileReader(file)
-                    
-                    for page_num in range(pdf_reader.numPages):
-                        page = pdf_reader.getPage(page_num)
-                        text = page.extractText()
-                        
-                        if text and text.strip():
-                            clean_text = ' '.join(text.replace('\n', ' ').split())
-                            if len(clean_text) > 50:
-                                text_chunks.append(clean_text)
-                    
-                    return text_chunks
+                    pages = ((n, pdf_reader.getPage(n).extractText) for n in range(pdf_reader.numPages))
+                
+                for page_index, extract in pages:
+                    text = extract()
+                    if text and text.strip():
+                        # Clean text: remove excessive whitespace
+                        clean_text = ' '.join(text.replace('\n', ' ').split())
+                        if len(clean_text) > 10:  # Keep short chunks that might be important
+                            yield page_index + 1, clean_text
                     
         except Exception as e:
             print(f"❌ Error reading PDF {pdf_path}: {e}")
-            return []
+            return
     
-    def search_in_documents(self, query, top_k=5):
+    def search_in_documents(self, query, top_k=5, partitions=None):
         """Search for query in PDF documents"""
-        if not self.documents:
-            print("⚠️ No documents loaded, returning mock results")
-            return self._get_mock_results(query)
+        return self.search_with_budget(query, top_k, partitions=partitions)[0]
+    
+    def search_with_budget(self, query, top_k=5, budget_ms=None, partitions=None):
+        """Search within an optional latency budget; returns (results, tier).
+        
+        `partitions` (from route()) limits the search to those product-line
+        sub-indexes; None searches all of them. Tiers, best first: 'cache' (same search on this index before),
+        'semantic' (ANN or exact embeddings), 'keyword' and 'defaults'
+        (canned results). With a budget, an engine whose recent latency does
+        not fit the time left is skipped for the next cheaper one; without
+        one this is the full semantic -> keyword -> defaults cascade.
+        """
+        if not len(self.chunks):
+            log.warning("No documents loaded, returning mock results")
+            return self._get_mock_results(query), 'defaults'
+        
+        cached = self._cache_get(query, top_k, partitions)
+        if cached is not None:
+            metrics.inc('search_cache_hits_total')
+            return cached, 'cache'
+        
+        started = time.perf_counter()
+        
+        def fits(engine):
+            if budget_ms is None:
+                return True
+            remaining = budget_ms - (time.perf_counter() - started) * 1000
+            with self._latency_lock:
+                if self.engine_latency_ms[engine] <= remaining:
+                    return True
+                # A skipped engine is never re-measured, so let its estimate decay: after a one-off slow
+                # call (cold start, GC pause) it soon fits again and the next run corrects it
+                self.engine_latency_ms[engine] *= self.SKIP_DECAY
+                return False
         
         try:
-            print(f"🔍 Searching for: '{query}'")
-            
             # Method 1: Semantic search with embeddings
             if self.model and self.embeddings is not None:
-                try:
-                    results = self._semantic_search(query, top_k)
-                    if results:
-                        print(f"✅ Semantic search found {len(results)} results")
-                        return results
-                    else:
-                        print("⚠️ Semantic search returned no results, trying keyword search")
-                except Exception as e:
-                    print(f"⚠️ Semantic search failed: {e}")
+                if fits('semantic'):
+                    try:
+                        results = self._timed('semantic', self._semantic_search, query, top_k, partitions)
+                        if results:
+                            log.debug("Semantic search for %r found %d results", query, len(results))
+                            self._cache_put(query, top_k, results, partitions)
+                            return results, 'semantic'
+                        else:
+                            log.debug("Semantic search for %r returned no results, trying keyword search", query)
+                    except Overloaded as e:
+                        log.debug("%s, answering %r with keyword search", e, query)
+                    except Exception as e:
+                        log.warning("Semantic search failed: %s", e)
+                else:
+                    log.debug("Semantic search (~%.0f ms) does not fit the budget for %r",
+                              self.engine_latency_ms['semantic'], query)
             
             # Method 2: Keyword search as fallback
-            results = self._keyword_search(query, top_k)
-            print(f"✅ Keyword search found {len(results)} results")
-            return results
+            if fits('keyword'):
+                metrics.inc('search_fallbacks_total', engine='keyword')
+                with metrics.span('keyword_search'):
+                    results = self._timed('keyword', self._keyword_search, query, top_k, partitions)
+                log.debug("Keyword search for %r found %d results", query, len(results))
+                if not self.model:
+                    # Keyword is the best this index can do; otherwise a later search may get semantic results
+                    self._cache_put(query, top_k, results, partitions)
+                return results, 'keyword'
+            
+            # Method 3: Out of time - canned answers cost nothing
+            return self._get_mock_results(query), 'defaults'
             
         except Exception as e:
-            print(f"❌ Search error: {e}")
-            import traceback
-            traceback.print_exc()
-            return self._get_mock_results(query)
+            log.exception("Search error for %r", query)
+            return self._get_mock_results(query), 'defaults'
     
-    def _semantic_search(self, query, top_k=5):
+    def _timed(self, engine, search, query, top_k, partitions=None):
+        started = time.perf_counter()
+        try:
+            return search(query, top_k, partitions)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._latency_lock:
+                self.engine_latency_ms[engine] = 0.8 * self.engine_latency_ms[engine] + 0.2 * elapsed_ms
+    
+    def _cache_get(self, query, top_k, partitions=None):
+        key = (' '.join(query.lower().split()), top_k, partitions)
+        with self._cache_lock:
+            results = self._result_cache.get(key)
+            if results is None:
+                return None
+            self._result_cache.move_to_end(key)
+        # Callers annotate and trim result dicts; hand out copies
+        return [dict(r) for r in results]
+    
+    def _cache_put(self, query, top_k, results, partitions=None):
+        if not self.result_cache_size:
+            return
+        key = (' '.join(query.lower().split()), top_k, partitions)
+        with self._cache_lock:
+            self._result_cache[key] = [dict(r) for r in results]
+            self._result_cache.move_to_end(key)
+            while len(self._result_cache) > self.result_cache_size:
+                self._result_cache.popitem(last=False)
+    
+    def _semantic_search(self, query, top_k=5, partitions=None):
         """Semantic search using embeddings"""
         try:
             # Encode query
-            query_embedding = self.model.encode([query])
-            
-            # Ensure embeddings is numpy array
-            if not isinstance(self.embeddings, np.ndarray):
-                self.embeddings = np.array(self.embeddings)
+            with metrics.span('policy_encode'):
+                query_embedding = (self.query_encoder or self.model).encode([query])
             
-            # Calculate similarities - FIXED: Proper array handling
-            # Use np.matmul for matrix multiplication
-            similarities = np.matmul(query_embedding, self.embeddings.T)
-            
-            # Flatten to 1D array
-            similarities = similarities.flatten()
-            
-            # Get top indices - FIXED: Check array size first
-            if len(similarities) == 0:
-                return []
-            
-            # Use argpartition for large arrays (more efficient)
-            if len(similarities) > top_k * 2:
-                # Get indices of top_k largest values
-                top_indices = np.argpartition(similarities, -top_k)[-top_k:]
-                # Sort these top indices
-                top_indices = top_indices[np.argsort(similarities[top_indices])[::-1]]
-            else:
-                # For small arrays, just sort all
-                top_indices = np.argsort(similarities)[::-1][:top_k]
-            
-            results = []
-            for idx in top_indices:
-                similarity_value = float(similarities[idx])
-                if similarity_value > 0.3:  # Relevance threshold
-                    results.append({
-                        'content': self.documents[idx],
-                        'source': self.metadata[idx]['source'],
-                        'page': self.metadata[idx]['page'],
-                        'pdf_path': self.metadata[idx]['pdf_path'],
-                        'chunk_hash': self.metadata[idx]['chunk_hash'],
-                        'relevance_score': similarity_value,
-                        'type': 'policy'
-                    })
-            
-            return results
+            with metrics.span('policy_index_search'):
+                return self._search_embedding(query_embedding, top_k, partitions)
             
+        except Overloaded:
+            raise
         except Exception as e:
-            print(f"❌ Semantic search error: {e}")
+            log.error("Semantic search error: %s", e)
             return []
     
-    def _keyword_search(self, query, top_k=5):
+    def _search_embedding(self, query_embedding, top_k=5, partitions=None):
+        """Rank chunks against an already encoded (1, dim) query"""
+        if self.partitioner is not None and partitions and not set(self.partition_rows()) <= set(partitions):
+            # Routed: only the named sub-indexes. A query for every partition is a plain full scan
+            # below (same top hits as merging each partition's), without per-partition copies
+            return self._search_partitions(query_embedding, top_k, partitions)
+        
+        if self.ann_index is not None:
+            # Approximate search over the same (normalized) vectors
+            scores, ids = self.ann_index.search(np.asarray(query_embedding, dtype=np.float32), top_k)
+            hits = [(int(idx), float(score)) for idx, score in zip(ids[0], scores[0]) if idx >= 0]
+            return [self.chunks.result(idx, score) for idx, score in hits if score > 0.3]
+        
+        # Ensure embeddings is numpy array
+        if not isinstance(self.embeddings, np.ndarray):
+            self.embeddings = np.array(self.embeddings)
+        
+        # Calculate similarities - FIXED: Proper array handling
+        # Use np.matmul for matrix multiplication
+        similarities = np.matmul(query_embedding, self.embeddings.T)
+        
+        # Flatten to 1D array
+        similarities = similarities.flatten()
+        
+        # Get top indices - FIXED: Check array size first
+        if len(similarities) == 0:
+            return []
+        
+        # Use argpartition for large arrays (more efficient)
+        if len(similarities) > top_k * 2:
+            # Get indices of top_k largest values
+            top_indices = np.argpartition(similarities, -top_k)[-top_k:]
+            # Sort these top indices
+            top_indices = top_indices[np.argsort(similarities[top_indices])[::-1]]
+        else:
+            # For small arrays, just sort all
+            top_indices = np.argsort(similarities)[::-1][:top_k]
+        
+        results = []
+        for idx in top_indices:
+            similarity_value = float(similarities[idx])
+            if similarity_value > 0.3:  # Relevance threshold
+                results.append(self.chunks.result(int(idx), similarity_value))
+        
+        return results
+    
+    def _search_partitions(self, query_embedding, top_k, partitions):
+        """Top hits of each partition, merged by score"""
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        rows_by_partition = self.partition_rows()
+        
+        if self.ann_index is not None:
+            rows = np.concatenate([rows_by_partition.get(name, np.zeros(0, dtype=np.int64)) for name in partitions])
+            hits = self._ann_search_rows(query_embedding, top_k, rows)
+            if hits is not None:
+                return [self.chunks.result(idx, score) for idx, score in hits if score > 0.3]
+            # The ANN index could not answer for this partition; rank its vectors exactly below
+        
+        candidates = []
+        for name in partitions:
+            rows = rows_by_partition.get(name)
+            if rows is None or not len(rows):
+                continue
+            similarities = np.matmul(query_embedding, self._partition_matrix(name).T).flatten()
+            k = min(top_k, len(similarities))
+            local = np.argpartition(similarities, -k)[-k:]
+            candidates.extend((float(similarities[i]), int(rows[i])) for i in local)
+        
+        candidates.sort(key=lambda x: x[0], reverse=True)
+        return [self.chunks.result(idx, score) for score, idx in candidates[:top_k] if score > 0.3]
+    
+    def _ann_search_rows(self, query_embedding, top_k, rows):
+        """Top (idx, score) hits among `rows` from the ANN index, or None if it can't find enough"""
+        wanted = min(top_k, len(rows))
+        if not wanted:
+            return []
+        try:
+            # Restrict the graph search itself to the partition's ids (faiss >= 1.7.3)
+            ids_array = np.ascontiguousarray(rows, dtype=np.int64)
+            selector = faiss.IDSelectorBatch(len(ids_array), faiss.swig_ptr(ids_array))
+            scores, ids = self.ann_index.search(query_embedding, top_k,
+                                                params=faiss.SearchParameters(sel=selector))
+            return [(int(idx), float(score)) for idx, score in zip(ids[0], scores[0]) if idx >= 0]
+        except Exception:
+            pass
+        # Older faiss: over-fetch from the whole graph and keep this route's chunks. A small
+        # partition next to a large one may have none of them in the over-fetch.
+        allowed = np.zeros(len(self.chunks), dtype=bool)
+        allowed[rows] = True
+        k = min(self.ann_index.ntotal, top_k * 10)
+        scores, ids = self.ann_index.search(query_embedding, k)
+        hits = [(int(idx), float(score)) for idx, score in zip(ids[0], scores[0])
+                if idx >= 0 and allowed[idx]][:top_k]
+        return hits if len(hits) >= wanted else None
+    
+    def partition_rows(self):
+        """{partition: array of chunk rows}, assigned by each chunk's first source file"""
+        with self._partition_lock:
+            state = (len(self.chunks), id(self.embeddings))
+            if self._partitions is None or self._partitions[:2] != state:
+                by_source = [self.partitioner.partition_of(source) for source in self.chunks.sources]
+                rows = {}
+                for idx, source_id in enumerate(self.chunks.source_ids):
+                    rows.setdefault(by_source[source_id], []).append(idx)
+                self._partitions = state + ({name: np.array(ids, dtype=np.int64) for name, ids in rows.items()},)
+                self._partition_vectors = {}
+            return self._partitions[2]
+    
+    def _partition_matrix(self, name):
+        rows = self.partition_rows()[name]
+        with self._partition_lock:
+            matrix = self._partition_vectors.get(name)
+            if matrix is None:
+                # Gathered once per index so a routed query reads only its product line's vectors
+                matrix = np.ascontiguousarray(np.asarray(self.embeddings)[rows], dtype=np.float32)
+                self._partition_vectors[name] = matrix
+            return matrix
+    
+    def route(self, claim_type):
+        """Partitions (a tuple) a case of this claim type should search, or None for all"""
+        if self.partitioner is None or not len(self.chunks):
+            return None
+        names = self.partitioner.route(claim_type) or ()
+        rows = self.partition_rows()
+        names = tuple(name for name in names if name in rows)
+        return names or None
+    
+    def partition_sizes(self):
+        if self.partitioner is None or not len(self.chunks):
+            return {}
+        return {name: len(rows) for name, rows in sorted(self.partition_rows().items())}
+    
+    def _keyword_search(self, query, top_k=5, partitions=None):
         """Simple keyword search"""
         query_words = [word.lower().strip() for word in query.split() if len(word) > 2]
         
         if not query_words:
             return []
         
-        results = []
+        scored = []
+        
+        if partitions and self.partitioner is not None:
+            rows = self.partition_rows()
+            indices = sorted(int(idx) for name in partitions for idx in rows.get(name, ()))
+            docs = ((idx, self.chunks.text_at(idx)) for idx in indices)
+        else:
+            docs = enumerate(self.chunks.iter_texts())
         
-        for idx, doc in enumerate(self.documents):
+        for idx, doc in docs:
             doc_lower = doc.lower()
             
             # Calculate relevance score
@@ -265,24 +558,16 @@ class PolicyRetriever:
                     continue
                 score = matches / len(query_words)
             
-            # Add result
-            results.append({
-                'content': doc,
-                'source': self.metadata[idx]['source'],
-                'page': self.metadata[idx]['page'],
-                'pdf_path': self.metadata[idx]['pdf_path'],
-                'chunk_hash': self.metadata[idx]['chunk_hash'],
-                'relevance_score': score,
-                'type': 'policy'
-            })
+            scored.append((score, idx))
         
-        # Sort by relevance score
-        results.sort(key=lambda x: x['relevance_score'], reverse=True)
-        return results[:top_k]
+        # Sort by relevance score, then build result dicts for the top hits only
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return [self.chunks.result(idx, score) for score, idx in scored[:top_k]]
     
     def _get_mock_results(self, query):
         """Fallback mock results when search fails"""
-        print(f"⚠️ Using mock results for query: {query}")
+        log.warning("Using mock results for query %r", query)
+        metrics.inc('search_fallbacks_total', engine='mock')
         
         # Try to find relevant mock data based on query
         query_lower = query.lower()
@@ -342,6 +627,97 @@ class PolicyRetriever:
                 'type': 'policy'
             }]
     
+    def build_ann_index(self, hnsw_m=32, ef_construction=200, ef_search=64):
+        """Build a FAISS HNSW index over the embeddings (no-op without faiss)"""
+        if faiss is None or self.embeddings is None:
+            print("⚠️ FAISS not available, semantic search stays exact")
+            return False
+        vectors = np.ascontiguousarray(self.embeddings, dtype=np.float32)
+        index = faiss.IndexHNSWFlat(vectors.shape[1], hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        index.hnsw.efSearch = ef_search
+        index.add(vectors)
+        self.ann_index = index
+        print(f"✅ HNSW index built over {index.ntotal} vectors")
+        return True
+    
+    def save_snapshot(self, snapshot_dir):
+        """Write chunks, embeddings, the ANN index and the answer table into `snapshot_dir`"""
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self.chunks.save(snapshot_dir)
+        if self.embeddings is not None:
+            np.save(os.path.join(snapshot_dir, 'embeddings.npy'),
+                    np.asarray(self.embeddings, dtype=np.float32))
+        if self.ann_index is not None:
+            faiss.write_index(self.ann_index, os.path.join(snapshot_dir, 'ann.index'))
+        if self.answer_table is not None:
+            self.answer_table.save(snapshot_dir)
+        
+        with open(os.path.join(snapshot_dir, 'retriever.json'), 'w') as f:
+            json.dump({
+                'embedding_model': self.embedding_model,
+                'docs_folder': self.docs_folder,
+                'pdf_files': self.pdf_files
+            }, f, indent=2)
+    
+    def load_snapshot(self, snapshot_dir):
+        """Load an index written by save_snapshot(); embeddings are memory-mapped"""
+        with open(os.path.join(snapshot_dir, 'retriever.json'), 'r') as f:
+            info = json.load(f)
+        if info.get('embedding_model') != self.embedding_model:
+            raise ValueError(f"Snapshot was built with {info.get('embedding_model')}, "
+                             f"not {self.embedding_model}")
+        
+        chunks = ChunkStore.load(snapshot_dir)
+        chunks.ensure_flags(CitationBuilder.compute_flags)
+        embeddings = None
+        embeddings_path = os.path.join(snapshot_dir, 'embeddings.npy')
+        if os.path.exists(embeddings_path):
+            embeddings = np.load(embeddings_path, mmap_mode='r')
+            if embeddings.shape[0] != len(chunks):
+                raise ValueError("Snapshot embeddings do not match chunk count")
+        
+        ann_index = None
+        ann_path = os.path.join(snapshot_dir, 'ann.index')
+        if faiss is not None and os.path.exists(ann_path):
+            ann_index = faiss.read_index(ann_path)
+        
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.ann_index = ann_index
+        self.docs_folder = info.get('docs_folder')
+        self.pdf_files = info.get('pdf_files', [])
+        print(f"✅ Loaded index snapshot {snapshot_dir}: {len(chunks)} chunks"
+              f"{' + HNSW' if ann_index is not None else ''}")
+        return True
+    
+    def get_chunk(self, chunk_hash):
+        """Full text and citation data of one indexed chunk, or None"""
+        idx = self.chunks.find(chunk_hash)
+        if idx is None:
+            return None
+        return self.chunks.result(idx, None)
+    
+    def get_page_text(self, chunk_hash):
+        """get_chunk() plus 'page_text', the whole page re-read from the PDF; None for an unknown chunk.
+        
+        Chunks are token windows, so the page is extracted again on demand.
+        'page_text' is None when the PDF is gone or changed since indexing
+        (the chunk no longer sits at its recorded offsets).
+        """
+        chunk = self.get_chunk(chunk_hash)
+        if chunk is None:
+            return None
+        chunk['page_text'] = None
+        pdf_path = chunk['pdf_path']
+        if pdf_path and os.path.exists(pdf_path):
+            for page_num, text in self._iter_pdf_pages(pdf_path):
+                if page_num == chunk['page']:
+                    if text[chunk['char_start']:chunk['char_end']] == chunk['content']:
+                        chunk['page_text'] = text
+                    break
+        return chunk
+    
     def get_document_count(self):
         """Get number of loaded PDF documents"""
         return len(self.pdf_files)
@@ -352,16 +728,36 @@ class PolicyRetriever:
     
     def get_total_chunks(self):
         """Get total number of text chunks"""
-        return len(self.documents)
+        return len(self.chunks)
+    
+    def memory_usage(self):
+        """Bytes held by the loaded index (embeddings, chunk text/metadata, ANN graph)"""
+        usage = self.chunks.memory_usage()
+        embeddings = self.embeddings
+        usage['embeddings_bytes'] = int(embeddings.nbytes) if embeddings is not None else 0
+        # Memory-mapped snapshots are paged in from the page cache and shared across workers
+        usage['embeddings_mmapped'] = isinstance(embeddings, np.memmap)
+        usage['ann_index_bytes'] = 0
+        if self.ann_index is not None:
+            # Flat float32 vectors plus the base-layer HNSW links (2*M int32 per vector)
+            index = self.ann_index
+            links = index.hnsw.nb_neighbors(0) if hasattr(index, 'hnsw') else 0
+            usage['ann_index_bytes'] = int(index.ntotal * (index.d + links) * 4)
+        usage['partition_vectors_bytes'] = sum(int(m.nbytes) for m in list(self._partition_vectors.values()))
+        usage['result_cache_entries'] = len(self._result_cache)
+        return usage
     
     def debug_info(self):
         """Return debug information"""
         return {
             'pdf_count': len(self.pdf_files),
-            'chunk_count': len(self.documents),
+            'chunk_count': len(self.chunks),
             'pdf_files': self.pdf_files,
             'has_embeddings': self.embeddings is not None,
             'embedding_shape': self.embeddings.shape if self.embeddings is not None else None,
+            'has_ann_index': self.ann_index is not None,
+            'partitions': self.partition_sizes(),
+            'snapshot_version': self.snapshot_version,
             'model_loaded': self.model is not None
         }
     
@@ -371,7 +767,7 @@ class PolicyRetriever:
         for pdf_file in self.pdf_files:
             try:
                 # Find the document folder
-                docs_folder = os.path.dirname(self.metadata[0]['pdf_path']) if self.metadata else 'data/documents'
+                docs_folder = self.docs_folder or 'data/documents'
                 pdf_path = os.path.join(docs_folder, pdf_file)
                 
                 text_chunks = self._extract_text_from_pdf(pdf_path)
@@ -0,0 +1,217 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+
+class BackupCorrupt(Exception):
+    """A backup chain exists but fails its integrity checks (checksum, record count, missing file)"""
+
+
+class PrecedentBackupManager:
+    """Incremental, compressed snapshots of precedent memory.
+
+    Backups are organised in chains under `backup_dir`. Each chain starts
+    with a base snapshot holding every record, followed by deltas holding
+    only the records appended since the previous snapshot. Every snapshot
+    is a gzipped JSON file whose sha256 is recorded in the chain manifest,
+    and a digest of the full state lets us tell whether the live file is
+    still an append-only continuation of the chain or needs a new base.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, backup_dir, keep_chains=5, max_deltas=20):
+        self.backup_dir = backup_dir
+        self.keep_chains = keep_chains
+        self.max_deltas = max_deltas
+        self._lock = threading.Lock()
+
+    def snapshot(self, precedents):
+        """Back up `precedents`, writing only what changed since the last snapshot"""
+        with self._lock:
+            if not precedents:
+                return {'created': False, 'reason': 'no precedents to back up'}
+
+            chain_id, manifest = self._latest_chain()
+            new_records = None
+            if manifest is not None and len(manifest['snapshots']) <= self.max_deltas:
+                last = manifest['snapshots'][-1]
+                total = last['total_records']
+                if (len(precedents) >= total
+                        and self._state_digest(precedents[:total]) == last['state_digest']):
+                    new_records = precedents[total:]
+
+            if new_records is None:
+                # Records were removed or rewritten (or chain too long) - start over
+                chain_id = f"chain_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+                manifest = {
+                    'chain_id': chain_id,
+                    'created': datetime.now().isoformat(),
+                    'snapshots': []
+                }
+                kind, records = 'base', precedents
+            elif not new_records:
+                return {
+                    'created': False,
+                    'reason': 'no new precedents since last snapshot',
+                    'chain_id': chain_id,
+                    'seq': manifest['snapshots'][-1]['seq']
+                }
+            else:
+                kind, records = 'delta', new_records
+
+            seq = len(manifest['snapshots'])
+            filename = f"{seq:04d}_{kind}.json.gz"
+            chain_dir = os.path.join(self.backup_dir, chain_id)
+            os.makedirs(chain_dir, exist_ok=True)
+
+            payload = gzip.compress(json.dumps(records).encode('utf-8'))
+            self._write_atomic(os.path.join(chain_dir, filename), payload)
+
+            entry = {
+                'seq': seq,
+                'kind': kind,
+                'file': filename,
+                'sha256': hashlib.sha256(payload).hexdigest(),
+                'record_count': len(records),
+                'total_records': len(precedents),
+                'state_digest': self._state_digest(precedents),
+                'compressed_bytes': len(payload),
+                'created': datetime.now().isoformat()
+            }
+            manifest['snapshots'].append(entry)
+            self._write_atomic(
+                os.path.join(chain_dir, self.MANIFEST),
+                json.dumps(manifest, indent=2).encode('utf-8')
+            )
+
+            pruned = self._prune()
+            log.info("Precedent %s snapshot %s/%s (%d records, %d bytes)",
+                     kind, chain_id, filename, len(records), len(payload))
+
+            return {
+                'created': True,
+                'chain_id': chain_id,
+                'seq': seq,
+                'kind': kind,
+                'file': os.path.join(chain_dir, filename),
+                'record_count': len(records),
+                'total_records': len(precedents),
+                'compressed_bytes': len(payload),
+                'pruned_chains': pruned
+            }
+
+    def restore(self, chain_id=None, upto_seq=None):
+        """Replay base plus deltas of a chain and return the precedent list.
+
+        Defaults to the newest chain and its latest snapshot. Raises
+        ValueError if the chain or sequence number does not exist and
+        BackupCorrupt if the chain fails its integrity checks.
+        """
+        if upto_seq is not None and (isinstance(upto_seq, bool) or not isinstance(upto_seq, int) or upto_seq < 0):
+            raise TypeError(f"upto_seq must be a non-negative integer, got {upto_seq!r}")
+        if chain_id is None:
+            chain_id, manifest = self._latest_chain()
+        else:
+            chain_id = os.path.basename(str(chain_id))
+            manifest = self._read_manifest(chain_id) if chain_id in self._chain_ids() else None
+        if manifest is None:
+            raise ValueError(f"Backup chain not found: {chain_id}")
+
+        if upto_seq is not None and not any(entry['seq'] == upto_seq for entry in manifest['snapshots']):
+            raise ValueError(f"Backup chain {manifest['chain_id']} has no snapshot {upto_seq}")
+
+        chain_dir = os.path.join(self.backup_dir, manifest['chain_id'])
+        precedents = []
+        for entry in manifest['snapshots']:
+            if upto_seq is not None and entry['seq'] > upto_seq:
+                break
+            try:
+                with open(os.path.join(chain_dir, entry['file']), 'rb') as f:
+                    payload = f.read()
+            except OSError as e:
+                raise BackupCorrupt(f"Cannot read {manifest['chain_id']}/{entry['file']}: {e}")
+            if hashlib.sha256(payload).hexdigest() != entry['sha256']:
+                raise BackupCorrupt(f"Checksum mismatch in {manifest['chain_id']}/{entry['file']}")
+
+            records = json.loads(gzip.decompress(payload).decode('utf-8'))
+            if entry['kind'] == 'base':
+                precedents = records
+            else:
+                precedents.extend(records)
+
+            if len(precedents) != entry['total_records']:
+                raise BackupCorrupt(f"Record count mismatch after {manifest['chain_id']}/{entry['file']}")
+
+        return precedents
+
+    def list_chains(self):
+        """Summaries of every backup chain, newest first"""
+        chains = []
+        for chain_id in self._chain_ids():
+            manifest = self._read_manifest(chain_id)
+            if manifest is None or not manifest['snapshots']:
+                continue
+            chains.append({
+                'chain_id': chain_id,
+                'created': manifest['created'],
+                'snapshots': len(manifest['snapshots']),
+                'total_records': manifest['snapshots'][-1]['total_records'],
+                'compressed_bytes': sum(s['compressed_bytes'] for s in manifest['snapshots'])
+            })
+        return chains
+
+    def _latest_chain(self):
+        for chain_id in self._chain_ids():
+            manifest = self._read_manifest(chain_id)
+            if manifest is not None and manifest['snapshots']:
+                return chain_id, manifest
+        return None, None
+
+    def _chain_ids(self):
+        if not os.path.isdir(self.backup_dir):
+            return []
+        return sorted(
+            (d for d in os.listdir(self.backup_dir) if d.startswith('chain_')),
+            reverse=True
+        )
+
+    def _read_manifest(self, chain_id):
+        path = os.path.join(self.backup_dir, chain_id, self.MANIFEST)
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _prune(self):
+        """Apply the retention policy: keep only the newest `keep_chains` chains"""
+        pruned = []
+        for chain_id in self._chain_ids()[self.keep_chains:]:
+            try:
+                shutil.rmtree(os.path.join(self.backup_dir, chain_id))
+                pruned.append(chain_id)
+            except OSError as e:
+                log.warning("Could not prune backup chain %s: %s", chain_id, e)
+        return pruned
+
+    @staticmethod
+    def _state_digest(precedents):
+        canonical = json.dumps(precedents, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
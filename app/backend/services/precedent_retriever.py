@@ -1,14 +1,23 @@
 import json
+import logging
 import os
 from datetime import datetime
 from sentence_transformers import SentenceTransformer
 import numpy as np
+from services.metrics import metrics
+from services.memory_monitor import deep_sizeof
+from services.admission import Overloaded
+
+log = logging.getLogger(__name__)
 
 class PrecedentRetriever:
     def __init__(self, precedents_file="data/precedent_cases.json"):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embedding_model = 'all-MiniLM-L6-v2'
+        self.model = SentenceTransformer(self.embedding_model)
         self.precedents = self.load_precedents(precedents_file)
         self.embeddings = None
+        self.encode_count = 0       # full re-encodes; should not grow per request
+        self.query_encoder = None   # e.g. a shared BatchingEncoder; None = encode with self.model
         self._encode_precedents()
     
     def load_precedents(self, filepath):
@@ -74,25 +83,35 @@ class PrecedentRetriever:
         
         if texts:
             self.embeddings = self.model.encode(texts)
+            self.encode_count += 1
+            metrics.inc('precedent_encodes_total')
             print(f"✅ Created embeddings for {len(texts)} precedents")
     
-    def find_similar_cases(self, case_context, top_k=5):
+    def find_similar_cases(self, case_context, top_k=5, answer_table=None):
         """Find similar precedent cases"""
-        if not self.precedents or not self.embeddings:
+        if not self.precedents or self.embeddings is None:
             return []
         
         # Create query from context
         query_text = self._create_query_from_context(case_context)
-        print(f"🔍 Searching precedents for: {query_text}")
+        log.debug("Searching precedents for: %s", query_text)
         
         try:
-            query_embedding = self.model.encode([query_text])
-            
-            # Calculate similarities
-            similarities = np.dot(query_embedding, self.embeddings.T)[0]
+            # Dropdown-only contexts have their query vector precomputed with the policy index
+            # (usable only if that index was built with this retriever's model)
+            query_embedding = None
+            if answer_table is not None:
+                query_embedding = answer_table.precedent_vector(query_text, self.embedding_model)
+            if query_embedding is None or query_embedding.shape[1] != self.embeddings.shape[1]:
+                with metrics.span('precedent_encode'):
+                    query_embedding = (self.query_encoder or self.model).encode([query_text])
             
-            # Get top matches
-            top_indices = np.argsort(similarities)[::-1][:top_k]
+            with metrics.span('precedent_index_search'):
+                # Calculate similarities
+                similarities = np.dot(query_embedding, self.embeddings.T)[0]
+                
+                # Get top matches
+                top_indices = np.argsort(similarities)[::-1][:top_k]
             
             results = []
             for idx in top_indices:
@@ -102,15 +121,19 @@ class PrecedentRetriever:
                     precedent['similarity_percent'] = int(similarities[idx] * 100)
                     results.append(precedent)
             
-            print(f"✅ Found {len(results)} similar precedent cases")
+            log.debug("Found %d similar precedent cases", len(results))
             return results
             
+        except Overloaded as e:
+            log.debug("%s, returning recent precedents", e)
+            return self.get_recent_precedents(top_k)
         except Exception as e:
-            print(f"⚠️ Error in similarity search: {e}")
+            log.warning("Error in similarity search: %s", e)
             # Return top precedents by recency as fallback
             return self.get_recent_precedents(top_k)
     
-    def _create_query_from_context(self, context):
+    @staticmethod
+    def _create_query_from_context(context):
         """Create search query from case context"""
         query_parts = []
         
@@ -150,6 +173,15 @@ class PrecedentRetriever:
         
         return sorted_precedents
     
+    def memory_usage(self):
+        """Bytes held by the in-memory precedent records and their embeddings"""
+        return {
+            'precedent_count': len(self.precedents),
+            'records_bytes': deep_sizeof(self.precedents),
+            'embeddings_bytes': int(self.embeddings.nbytes) if self.embeddings is not None else 0,
+            'encode_count': self.encode_count
+        }
+    
     def add_precedent(self, precedent_data):
         """Add a new precedent to memory"""
         try:
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl - the in-process writer thread still serializes saves
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+
+class _PendingWrite:
+    """A queued operation waiting for the writer thread to make it durable"""
+
+    def __init__(self, kind, payload):
+        self.kind = kind          # 'append' or 'replace'
+        self.payload = payload
+        self.result = None
+        self.total = 0
+        self.error = None
+        self.state = 'queued'     # queued -> claimed (by the writer) | cancelled (by a timed-out caller)
+        self.done = threading.Event()
+
+
+class PrecedentWriter:
+    """Single background writer that group-commits precedent saves.
+
+    Request threads push records onto a queue and block until the writer
+    has fsync'd the batch containing them. The writer drains whatever
+    arrives within `batch_window` seconds (up to `max_batch` records) and
+    commits it with one read-modify-write of the JSON file, so concurrent
+    saves never race and share the cost of a single rewrite.
+    """
+
+    def __init__(self, precedents_file, batch_window=0.01, max_batch=64):
+        self.precedents_file = precedents_file
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.seq_file = precedents_file + '.seq'
+        self.lock_file = precedents_file + '.lock'
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._claim_lock = threading.Lock()   # decides between writer claim and caller cancel
+
+    def submit(self, precedent_data, timeout=10.0):
+        """Queue a precedent and wait until it is durable.
+
+        Returns (saved_record, total_precedents). The record's `id` is
+        allocated by the writer and is strictly increasing.
+        """
+        record = dict(precedent_data)
+        record['timestamp'] = datetime.now().isoformat()
+        op = self._enqueue('append', record, timeout)
+        return op.result, op.total
+
+    def replace(self, precedents, timeout=10.0):
+        """Atomically replace the whole precedent list (clear/restore)"""
+        op = self._enqueue('replace', list(precedents), timeout)
+        return op.total
+
+    def clear(self, timeout=10.0):
+        """Empty the precedent file without resetting the ID sequence"""
+        return self.replace([], timeout)
+
+    def _enqueue(self, kind, payload, timeout):
+        self._ensure_started()
+        op = _PendingWrite(kind, payload)
+        self._queue.put(op)
+        if not op.done.wait(timeout):
+            with self._claim_lock:
+                if op.state == 'queued':
+                    # Not picked up yet: withdraw it, so a retry after this error can't duplicate it
+                    op.state = 'cancelled'
+                    raise TimeoutError(f"Precedent write not committed within {timeout}s (cancelled)")
+            # Already being committed: the outcome is moments away, report that instead of guessing
+            op.done.wait()
+        if op.error is not None:
+            raise op.error
+        return op
+
+    def reset_after_fork(self):
+        """Give a forked child its own queue; the writer thread restarts on the next save"""
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='precedent-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        with self._claim_lock:
+            batch = [op for op in batch if op.state != 'cancelled']
+            for op in batch:
+                op.state = 'claimed'
+        if not batch:
+            return
+        precedents = []
+        try:
+            with self._file_lock():
+                # A batch that starts by replacing the list doesn't need the old one (e.g. restoring
+                # over a damaged file); the sequence file still keeps IDs increasing
+                precedents = [] if batch[0].kind == 'replace' else self._read_precedents()
+                next_id = self._next_id(precedents)
+
+                for op in batch:
+                    if op.kind == 'append':
+                        op.payload['id'] = next_id
+                        next_id += 1
+                        precedents.append(op.payload)
+                        op.result = op.payload
+                    elif op.kind == 'replace':
+                        precedents = op.payload
+                        next_id = max(next_id, self._max_id(precedents) + 1)
+
+                self._write_atomic(self.precedents_file, json.dumps(precedents, indent=2))
+                self._write_atomic(self.seq_file, str(next_id - 1))
+
+            if len(batch) > 1:
+                log.info("Group-committed %d precedent writes", len(batch))
+        except Exception as e:
+            log.error("Error committing precedent batch: %s", e)
+            for op in batch:
+                op.error = e
+        finally:
+            for op in batch:
+                op.total = len(precedents)
+                op.done.set()
+
+    def _read_precedents(self):
+        """The current list; raises on an unreadable file rather than overwriting it with just this batch"""
+        if not os.path.exists(self.precedents_file):
+            return []
+        try:
+            with open(self.precedents_file, 'r') as f:
+                precedents = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"Precedents file {self.precedents_file} is corrupt, not writing over it: {e}")
+        if not isinstance(precedents, list):
+            raise ValueError(f"Precedents file {self.precedents_file} does not hold a list, not writing over it")
+        return precedents
+
+    def _next_id(self, precedents):
+        last_id = self._max_id(precedents)
+        try:
+            with open(self.seq_file, 'r') as f:
+                last_id = max(last_id, int(f.read().strip() or 0))
+        except (OSError, ValueError):
+            pass
+        return last_id + 1
+
+    @staticmethod
+    def _max_id(precedents):
+        ids = [p.get('id') for p in precedents if isinstance(p.get('id'), int)]
+        return max(ids) if ids else 0
+
+    @staticmethod
+    def _write_atomic(path, text):
+        """Write to a temp file, fsync it and rename over the target"""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        # Persist the rename itself (not supported on Windows)
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except (OSError, AttributeError):
+            pass
+
+    def _file_lock(self):
+        return _FileLock(self.lock_file)
+
+
+class _FileLock:
+    """Advisory lock so separate processes don't interleave read-modify-write"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._fd = open(self.path, 'a')
+            fcntl.flock(self._fd.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._fd is not None:
+            fcntl.flock(self._fd.fileno(), fcntl.LOCK_UN)
+            self._fd.close()
+            self._fd = None
+        return False
+
@@ -0,0 +1,160 @@
+import cProfile
+import functools
+import hmac
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+
+from flask import request, make_response
+
+from services.metrics import inline_work
+
+log = logging.getLogger(__name__)
+
+# Where time went, by the file a function lives in (first match wins)
+CATEGORIES = (
+    ('model', ('sentence_transformers', 'transformers', 'torch', 'tokenizers')),
+    ('faiss', ('faiss',)),
+    ('numpy', ('numpy',)),
+    ('json', ('json', 'flask/json')),
+    ('pdf', ('PyPDF2',)),
+    ('app', ('services', 'app.py')),
+)
+
+
+class RequestProfiler:
+    """Run individual, explicitly flagged requests under cProfile.
+
+    A request is profiled only when it carries the admin token in the
+    X-Profile header or the `profile` query parameter and a token is
+    configured (PROFILE_TOKEN). Unflagged requests go straight to the view.
+    The report lists the top functions by cumulative time plus self time
+    per category (model, numpy, json, ...), is saved under `store_dir` and
+    is added to JSON responses as `profile`.
+
+    A profiled request runs its legs and query encodes on its own thread
+    (services.metrics.inline_work) and never joins another request's
+    computation, so the profile holds all of its work. On Python 3.12+
+    cProfile also records other threads: profile on a quiet worker.
+    """
+
+    def __init__(self, store_dir=None, token=None, top_n=25, keep=50):
+        self.store_dir = store_dir
+        self.token = token if token is not None else os.environ.get('PROFILE_TOKEN', '')
+        self.top_n = top_n
+        self.keep = keep
+        # cProfile hooks are process-wide on newer Pythons; profile one request at a time
+        self._busy = threading.Lock()
+
+    def requested(self):
+        if not self.token:
+            return False
+        supplied = request.headers.get('X-Profile') or request.args.get('profile')
+        return bool(supplied) and hmac.compare_digest(supplied.encode('utf-8'), self.token.encode('utf-8'))
+
+    def profiled(self, endpoint):
+        """Decorator for Flask views that can be profiled on demand"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.requested():
+                    return view(*args, **kwargs)
+                return self._run_profiled(endpoint, view, args, kwargs)
+            return wrapper
+        return decorator
+
+    def _run_profiled(self, endpoint, view, args, kwargs):
+        if not self._busy.acquire(blocking=False):
+            response = make_response(view(*args, **kwargs))
+            return self._attach(response, {'skipped': 'another profiled request is in progress'})
+
+        try:
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                # cProfile only sees the thread that enabled it (before Python 3.12), so the
+                # request's legs and query encodes run here rather than in pool/encoder threads
+                with inline_work():
+                    response = make_response(view(*args, **kwargs))
+            finally:
+                profiler.disable()
+            wall_seconds = time.perf_counter() - started
+        finally:
+            self._busy.release()
+
+        report = self.build_report(profiler, endpoint, wall_seconds)
+        report['saved_to'] = self._store(report)
+        log.info("Profiled %s in %.3fs", endpoint, wall_seconds, extra={'profile_file': report['saved_to']})
+        return self._attach(response, report)
+
+    def build_report(self, profiler, endpoint, wall_seconds):
+        stats = pstats.Stats(profiler)
+        rows = []
+        by_category = {}
+        for (filename, line, func), (_, calls, self_time, cumulative, _) in stats.stats.items():
+            rows.append((cumulative, self_time, calls, filename, line, func))
+            category = self._categorize(filename, func)
+            by_category[category] = by_category.get(category, 0.0) + self_time
+
+        rows.sort(reverse=True)
+        return {
+            'endpoint': endpoint,
+            'created': datetime.now().isoformat(),
+            'wall_seconds': round(wall_seconds, 6),
+            'total_calls': stats.total_calls,
+            'self_seconds_by_category': {
+                k: round(v, 6) for k, v in sorted(by_category.items(), key=lambda kv: -kv[1])
+            },
+            'top_cumulative': [
+                {
+                    'function': func,
+                    'file': filename,
+                    'line': line,
+                    'calls': calls,
+                    'self_seconds': round(self_time, 6),
+                    'cumulative_seconds': round(cumulative, 6)
+                }
+                for cumulative, self_time, calls, filename, line, func in rows[:self.top_n]
+            ]
+        }
+
+    @staticmethod
+    def _categorize(filename, func):
+        # C functions have no file; their name says which extension they belong to
+        path = func if filename == '~' else filename.replace('\\', '/')
+        for category, markers in CATEGORIES:
+            if any(marker in path for marker in markers):
+                return category
+        return 'builtin' if filename == '~' else 'other'
+
+    @staticmethod
+    def _attach(response, report):
+        if response.is_json:
+            body = response.get_json(silent=True)
+            if isinstance(body, dict):
+                body['profile'] = report
+                response.set_data(json.dumps(body, default=str))
+        return response
+
+    def _store(self, report):
+        if not self.store_dir:
+            return None
+        try:
+            os.makedirs(self.store_dir, exist_ok=True)
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            path = os.path.join(self.store_dir, f"profile_{stamp}_{report['endpoint']}.json")
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+
+            saved = sorted(n for n in os.listdir(self.store_dir) if n.startswith('profile_'))
+            for old in saved[:-self.keep]:
+                os.remove(os.path.join(self.store_dir, old))
+            return path
+        except OSError as e:
+            log.warning("Could not store profile: %s", e)
+            return None
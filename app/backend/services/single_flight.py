@@ -0,0 +1,79 @@
+import json
+import threading
+
+from services.metrics import metrics
+
+
+class _Call:
+    """One in-flight computation and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent identical computations into one.
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it runs wait for it and get the same result (or the
+    same exception). Nothing is kept once the call finishes - this removes
+    duplicate work between simultaneous requests, it is not a cache.
+    """
+
+    def __init__(self, name, wait_timeout=30.0):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Returns (result, shared); shared is True if another caller computed it"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result, False
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+                if call.waiters:
+                    metrics.inc('singleflight_shared_total', call.waiters, flight=self.name)
+
+        if not call.done.wait(self.wait_timeout):
+            raise TimeoutError(f"{self.name}: shared computation still running after {self.wait_timeout}s")
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def flight_key(*parts):
+    """Stable key for JSON-like parts: dict keys sorted, string whitespace collapsed"""
+    return json.dumps([_normalize(part) for part in parts], sort_keys=True, default=str)
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
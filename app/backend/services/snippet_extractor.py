@@ -0,0 +1,103 @@
+import re
+
+
+class SnippetExtractor:
+    """Cut a query-focused excerpt out of a chunk instead of returning the whole page"""
+
+    SENTENCE_PATTERN = re.compile(r'[^.!?;]+(?:[.!?;]+|$)')
+    WORD_PATTERN = re.compile(r'[a-z0-9$][a-z0-9,$]*')
+    STOP_WORDS = {
+        'the', 'and', 'for', 'with', 'that', 'this', 'from', 'are', 'was',
+        'insurance', 'claim', 'policy', 'state'
+    }
+
+    def __init__(self, max_chars=320):
+        self.max_chars = max_chars
+
+    def query_terms(self, query):
+        """Distinct lowercase query words worth highlighting"""
+        terms = []
+        for word in self.WORD_PATTERN.findall((query or '').lower()):
+            word = word.strip(',')
+            if len(word) > 2 and word not in self.STOP_WORDS and word not in terms:
+                terms.append(word)
+        return terms
+
+    def extract(self, text, query):
+        """Return the best-scoring sentence window for `query`.
+
+        The result holds the snippet, its character span in `text`, and
+        highlight offsets ([start, end] pairs) relative to the snippet.
+        """
+        text = text or ''
+        terms = self.query_terms(query)
+
+        if len(text) <= self.max_chars:
+            start, end = 0, len(text)
+        else:
+            start, end = self._best_window(text, terms)
+
+        snippet = text[start:end]
+        return {
+            'snippet': snippet,
+            'snippet_start': start,
+            'snippet_end': end,
+            'highlights': self._highlights(snippet, terms),
+            'truncated': start > 0 or end < len(text)
+        }
+
+    def _best_window(self, text, terms):
+        sentences = [(m.start(), m.end()) for m in self.SENTENCE_PATTERN.finditer(text)
+                     if m.group().strip()]
+        if not sentences:
+            return 0, min(len(text), self.max_chars)
+
+        text_lower = text.lower()
+        scores = [self._score(text_lower[s:e], terms) for s, e in sentences]
+        best = max(range(len(sentences)), key=lambda i: (scores[i], -i))
+
+        start, end = sentences[best]
+        if end - start > self.max_chars:
+            # One long sentence: centre the window on the first matching term
+            anchor = start
+            for term in terms:
+                pos = text_lower.find(term, start, end)
+                if pos != -1:
+                    anchor = pos
+                    break
+            start = max(start, anchor - self.max_chars // 4)
+            return start, min(end, start + self.max_chars)
+
+        # Grow towards whichever neighbouring sentence scores higher while it fits
+        lo, hi = best, best
+        while True:
+            candidates = []
+            if lo > 0 and sentences[hi][1] - sentences[lo - 1][0] <= self.max_chars:
+                candidates.append((scores[lo - 1], 'left'))
+            if hi + 1 < len(sentences) and sentences[hi + 1][1] - sentences[lo][0] <= self.max_chars:
+                candidates.append((scores[hi + 1], 'right'))
+            if not candidates:
+                break
+            if max(candidates)[1] == 'left':
+                lo -= 1
+            else:
+                hi += 1
+
+        start, end = sentences[lo][0], sentences[hi][1]
+        # Drop leading whitespace left over from the sentence split
+        while start < end and text[start].isspace():
+            start += 1
+        return start, end
+
+    @staticmethod
+    def _score(sentence_lower, terms):
+        matched = [t for t in terms if t in sentence_lower]
+        return len(matched) * 10 + sum(sentence_lower.count(t) for t in matched)
+
+    @staticmethod
+    def _highlights(snippet, terms):
+        if not terms:
+            return []
+        pattern = re.compile('|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True)),
+                             re.IGNORECASE)
+        return [[m.start(), m.end()] for m in pattern.finditer(snippet)]
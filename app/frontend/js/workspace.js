@@ -405,6 +405,13 @@ class AppianKnowledgeAssistant {
                                 style="padding: 8px 12px; background: #718096; color: white; border: none; border-radius: 4px; cursor: pointer;">
                             🔍 Test PDF Link
                         </button>
+                        
+                        <!-- Full page text is fetched only when asked for -->
+                        ${policy.full_text_url ? `
+                        <button onclick="loadFullPolicyText(this, '${policy.full_text_url}')" 
+                                style="padding: 8px 12px; background: #48bb78; color: white; border: none; border-radius: 4px; cursor: pointer;">
+                            📖 Show full page
+                        </button>` : ''}
                     </div>
                     
                     <small style="display: block; color: #666; margin-top: 5px;">
@@ -1042,6 +1049,31 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     `;
     document.head.appendChild(style);
+    // Replace a policy snippet with its full page text (fetched on demand)
+window.loadFullPolicyText = async function(button, fullTextUrl) {
+    const policyDiv = button.closest('.policy');
+    const contentElement = policyDiv ? policyDiv.querySelector('.policy-content') : null;
+    if (!contentElement) return;
+    
+    button.disabled = true;
+    try {
+        const response = await fetch(`http://localhost:5000${fullTextUrl}`);
+        const data = await response.json();
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || `HTTP ${response.status}`);
+        }
+        contentElement.textContent = data.content;
+        if (data.scope !== 'page') {
+            // The PDF could not be re-read; this is only the indexed passage
+            contentElement.title = 'Full page unavailable - showing the indexed passage';
+        }
+        button.remove();
+    } catch (error) {
+        console.error("❌ Could not load full policy text:", error);
+        button.disabled = false;
+    }
+};
+
     // Simple direct PDF testing
 window.testDirectPDF = function(pdfUrl, filename) {
     console.log(`Testing PDF: ${filename}`);